@@ -10,11 +10,18 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import functools
 import json
 import logging
 import re
+import time
 
+from concurrent.futures import ThreadPoolExecutor
+
+from denbi.perun.fingerprint import fingerprint
 from denbi.perun.keystone import KeyStone
+from denbi.perun.plan import Planner, propagated_quotas
+from denbi.perun.quotas.manager import QuotaMap
 
 
 def import_json(path):
@@ -28,6 +35,79 @@ def import_json(path):
     return json_obj
 
 
+def iter_json(source, chunk_size=65536):
+    """
+    Read source as json array and yield its elements one after another.
+
+    In contrast to import_json the file is read in chunks and only the element currently
+    decoded is kept in memory, so the memory needed is bounded by the largest element
+    instead of the whole file.
+
+    :param source: json file to read (path or text file object), must contain an array
+    :param chunk_size: number of characters read at once
+    :return: generator of json objects
+    """
+    if hasattr(source, 'read'):
+        yield from _iter_json_file(source, getattr(source, 'name', source), chunk_size)
+    else:
+        with open(source, 'r', encoding='utf-8') as json_file:
+            yield from _iter_json_file(json_file, source, chunk_size)
+
+
+# characters allowed after an array element and characters continuing a number
+_JSON_ELEMENT_END = frozenset(', ]\t\n\r')
+_JSON_NUMBER = frozenset('0123456789.eE+-')
+
+
+def _iter_json_file(json_file, path, chunk_size):
+    decoder = json.JSONDecoder()
+    buffer = json_file.read(chunk_size)
+    while buffer and not buffer.strip():
+        buffer = json_file.read(chunk_size)
+    buffer = buffer.lstrip()
+    if not buffer.startswith('['):
+        raise ValueError(f"{path} does not contain a json array")
+    buffer = buffer[1:]
+    eof = False
+    # elements are separated by commas
+    first = True
+    separator = False
+
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(']') and (first or separator):
+            return
+        if separator and buffer:
+            if not buffer.startswith(','):
+                raise ValueError(f"{path} contains invalid json at '{buffer[:20]}'")
+            buffer = buffer[1:].lstrip()
+            separator = False
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            end = None
+        if end is not None and end < len(buffer) and buffer[end] not in _JSON_ELEMENT_END:
+            # a number cut by the chunk boundary (e.g. "-1500." of "-1500.0") is decoded partially
+            if eof or not isinstance(obj, (int, float)) or isinstance(obj, bool) or buffer[end] not in _JSON_NUMBER:
+                raise ValueError(f"{path} contains invalid json at '{buffer[end:end + 20]}'")
+            end = None
+        # an element is only complete if followed by something, otherwise read more
+        if end is None or end == len(buffer):
+            if eof:
+                if end is None:
+                    raise ValueError(f"{path} contains an incomplete json array")
+                raise ValueError(f"{path} contains an unterminated json array")
+            # grow reads with the buffer to keep large elements linear
+            chunk = json_file.read(max(chunk_size, len(buffer)))
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        first = False
+        separator = True
+        yield obj
+
+
 def validate_cidr(cidr):
     """
     Validates a CIDR (Classless Inter-Domain Routing) notation
@@ -111,7 +191,11 @@ class Endpoint(object):
                  read_only=False,
                  logging_domain="denbi",
                  report_domain="report",
-                 ssh_key_blocklist=None):
+                 ssh_key_blocklist=None,
+                 workers=1,
+                 fingerprint_store=None,
+                 map_ttl=0,
+                 quota_check_interval=86400):
         '''
 
         :param keystone: initialized keystone object
@@ -124,10 +208,19 @@ class Endpoint(object):
         :param support_default_ssh_sgrule: should a ssh sg rule created with defautl sg
         :param external_network_id: neutron id of external network used
         :param network_cidr: CIDR notation of the internal network to be created
-        :param read_only: test mode
+        :param read_only: test mode, changes are only planned and logged but not applied
         :param logging_domain: domain where "standard" logs are logged (default is "denbi")
         :param report_domain: domain where "update" logs are reported (default is "report")
         :param ssh_key_blocklist: list of blocked (=leaked) ssh_keys (
+        :param workers: number of keystone/openstack modifications running in parallel (default is 1)
+        :param fingerprint_store: FingerprintStore, records unchanged since the last successful import
+                                  are not compared against keystone again (default is None - compare all)
+        :param map_ttl: seconds the keystone user and project maps are reused by subsequent imports
+                        (default is 0 - maps are loaded for every import)
+        :param quota_check_interval: seconds between two imports comparing the quotas of all projects with
+                                     the quota services, otherwise only changed propagated quotas are set. With
+                                     fingerprints the quotas are compared on full reconciliations. (default is
+                                     86400, 0 compares them on every import)
         '''
 
         if ssh_key_blocklist is None:
@@ -154,9 +247,21 @@ class Endpoint(object):
         self.network_cidr = network_cidr
         self.read_only = read_only
         self.ssh_key_blocklist = ssh_key_blocklist
+        self.workers = max(int(workers), 1)
+        self.fingerprint_store = fingerprint_store
+        self.map_ttl = map_ttl
+        self._maps_loaded = None
+        self.quota_check_interval = quota_check_interval
+        self._quotas_checked = 0
         self.log = logging.getLogger(logging_domain)
         self.log2 = logging.getLogger(report_domain)
 
+        self.planner = Planner(quota_mapping=self.DENBI_OPENSTACK_QUOTA_MAPPING if self.support_quotas else None,
+                               support_router=self.support_router,
+                               support_network=self.support_network,
+                               support_default_ssh_sgrule=self.support_default_ssh_sgrule,
+                               logging_domain=logging_domain)
+
         # check if CIDR mask
         if not (validate_cidr(self.network_cidr)):
             raise RuntimeError(f"Network CIDR '{self.network_cidr}' is invalid.")
@@ -175,274 +280,435 @@ class Endpoint(object):
         '''
         Import data (in the given mode) into Keystone
 
-        :param users_path: Path to user data (must be in json format)
-        :param groups_path: Path to project data (must be in json format)
-        :return:
+        The propagated data is compared with the current Keystone state first, resulting
+        in a plan of changes. In read-only mode the plan is only logged, otherwise it
+        is applied afterwards.
+
+        :param users_path: Path to (or text file object of) user data (must be in json format)
+        :param groups_path: Path to (or text file object of) project data (must be in json format)
+        :return: the computed plan, plan.complete tells whether it was fully applied
         '''
 
         self.log.info("Importing data mode=%s users_path=%s groups_path=%s", self.mode, users_path, groups_path)
+        try:
+            if self.fingerprint_store is not None:
+                return self._import_changed_data(users_path, groups_path)
+
+            users = self.iter_users(users_path)
+            projects = self.iter_projects(groups_path)
+
+            # get current user_map and project_map from keystone
+            user_map, project_map = self._keystone_maps()
+
+            started = time.time()
+            check_quotas = self._quota_check_due()
+            plan = self.planner.plan(users, projects, user_map, project_map, check_quotas=check_quotas)
+            self._apply_or_log(plan)
+            if check_quotas and not self.read_only:
+                self._quotas_checked = started
+            return plan
+        except Exception:
+            # the maps may not reflect keystone anymore
+            self.invalidate()
+            raise
+
+    def _quota_check_due(self):
+        '''
+        Return True if the quotas of all projects have to be compared with the quota services.
+        '''
+        return self.quota_check_interval <= 0 or time.time() - self._quotas_checked >= self.quota_check_interval
+
+    def invalidate(self):
+        '''
+        Forget the keystone user and project maps and the cached quotas, the next import loads them again.
+        '''
+        self._maps_loaded = None
+        self.keystone.quota_factory.flush()
+
+    def _keystone_maps(self, reload=False, ssh_keys_for=None, members_for=None):
+        '''
+        Return the keystone user and project maps, reusing the maps of a previous import if
+        they are younger than map_ttl seconds. Maps are never reused in read-only mode, since
+        they are modified by the planned changes there.
+
+        :param reload: load the maps in any case
+        :param ssh_keys_for: see KeyStone.users_map
+        :param members_for: see KeyStone.projects_map
+        '''
+        if not reload and not self.read_only and self._maps_loaded is not None \
+                and time.time() - self._maps_loaded < self.map_ttl:
+            self.log.debug("Reusing keystone maps loaded %.0f seconds ago.", time.time() - self._maps_loaded)
+            return self.keystone.denbi_user_map, self.keystone.denbi_project_map
+
+        loaded = time.time()
+        if ssh_keys_for is None and members_for is None:
+            user_map = self.keystone.users_map()
+            project_map = self.keystone.projects_map()
+        else:
+            user_map = self.keystone.users_map(ssh_keys_for=ssh_keys_for)
+            project_map = self.keystone.projects_map(members_for=members_for)
+        self._maps_loaded = loaded
+        return user_map, project_map
+
+    def _import_changed_data(self, users_path, groups_path):
+        '''
+        Import data using the fingerprint store. Only users and projects whose fingerprint changed
+        since the last successful import (or whose keystone counterpart changed its id) are compared
+        against keystone, unless a full reconciliation is due.
+        '''
+        store = self.fingerprint_store
+        store.load(self._fingerprint_context())
+        full_reconcile = store.full_reconcile_due()
+        if full_reconcile:
+            self.log.info("Full reconciliation due, comparing all users and projects.")
+
+        # ssh keys and members are only loaded for changed records
+        user_map, project_map = self._keystone_maps(reload=full_reconcile, ssh_keys_for=(), members_for=())
+
+        users, unchanged_users = self._changed_records('users', self.iter_users(users_path),
+                                                       user_map, full_reconcile)
+        projects, unchanged_projects = self._changed_records('projects', self.iter_projects(groups_path),
+                                                             project_map, full_reconcile)
+        self.log.info("Comparing %d users (%d unchanged) and %d projects (%d unchanged).",
+                      len(users), len(unchanged_users), len(projects), len(unchanged_projects))
+        self.keystone.users_load_ssh_keys(user['perun_id'] for user in users)
+
+        # unchanged projects are not part of projects, so all quotas can only be checked on full reconciliations
+        plan = self.planner.plan(users, projects, user_map, project_map, unchanged_users, unchanged_projects,
+                                 check_quotas=full_reconcile)
+        self._apply_or_log(plan)
+
+        if not self.read_only:
+            user_entries = {perun_id: store.entries['users'][perun_id] for perun_id in unchanged_users}
+            user_entries.update((user['perun_id'], [fingerprint(user), user_map[user['perun_id']]['id']])
+                                for user in users)
+            project_entries = {perun_id: store.entries['projects'][perun_id] for perun_id in unchanged_projects}
+            # projects with (partly) failed quota updates or ignored members are compared again next time,
+            # ignored members may be created by a later import
+            project_entries.update((project['perun_id'], [fingerprint(project), project_map[project['perun_id']]['id']])
+                                   for project in projects if self._quotas_applied(project, project_map)
+                                   and project['perun_id'] not in plan.ignored_members)
+            store.update('users', user_entries, full_reconcile)
+            store.update('projects', project_entries, full_reconcile)
+            store.save()
+        return plan
+
+    def _changed_records(self, kind, records, current_map, full_reconcile):
+        '''
+        Split the given records in changed records and perun ids of unchanged records.
+        '''
+        changed = []
+        unchanged = set()
+        store = self.fingerprint_store
+        for record in records:
+            perun_id = record['perun_id']
+            if not full_reconcile and store.unchanged(kind, record) and perun_id in current_map \
+                    and current_map[perun_id]['id'] == store.keystone_id(kind, perun_id):
+                unchanged.add(perun_id)
+            else:
+                changed.append(record)
+        return changed, unchanged
+
+    def _quotas_applied(self, project, project_map):
+        '''
+        Return False if the propagated quotas of the given normalized project are not stored in keystone.
+        '''
+        if self.planner.quota_mapping is None or project.get('quotas', None) is None:
+            return True
+        return project_map[project['perun_id']].get('denbi_quotas', None) == \
+            propagated_quotas(project['quotas'], self.planner.quota_mapping)
+
+    def _fingerprint_context(self):
+        '''
+        Return a string identifying all settings that influence the result of an import.
+        '''
+        return json.dumps({'mode': self.mode,
+                           'domain': str(getattr(self.keystone, 'target_domain_id', None)),
+                           'flag': getattr(self.keystone, 'flag', None),
+                           'store_email': self.store_email,
+                           'support_quotas': self.support_quotas,
+                           'support_elixir_name': self.support_elixir_name,
+                           'support_ssh_key': self.support_ssh_key,
+                           'ssh_key_blocklist': sorted(self.ssh_key_blocklist)}, sort_keys=True)
+
+    def _apply_or_log(self, plan):
+        '''
+        Apply the given plan, in read-only mode the changes are only logged.
+        '''
+        self.log.info("Planned changes: %s", plan.counts())
+
+        if self.read_only:
+            for change in plan:
+                self.log2.info(f"read-only: would apply {change}")
+        else:
+            self.apply_plan(plan)
+
+    def iter_users(self, users_path):
+        '''
+        Stream the users of the given file (in the given mode) as normalized users (see Planner).
+        Users without mandatory fields are skipped.
+
+        :param users_path: Path to user data (must be in json format)
+        :return: generator of normalized users
+        '''
         if self.mode == "scim":
-            self.__import_scim_userdata__(import_json(users_path))
-            self.__import_scim_projectdata__(import_json(groups_path))
+            normalize = self._normalize_scim_user
         elif self.mode == "denbi_portal_compute_center":
-            self.__import_dpcc_userdata__(import_json(users_path))
-            self.__import_dpcc_projectdata__(import_json(groups_path))
+            normalize = self._normalize_dpcc_user
         else:
             raise ValueError("Unknown/Unsupported mode!")
+        return filter(None, map(normalize, iter_json(users_path)))
 
-    def __import_scim_userdata__(self, json_obj):
-        '''
-        Import users data in scim format
-        :param json_obj:
-        :return:
+    def iter_projects(self, groups_path):
         '''
-        # get current user_map from keystone
-        user_map = self.keystone.users_map()
-
-        user_ids = []
-
-        # convert scim json to keystone compatible hash
-        for scim_user in json_obj:
-
-            # check for mandatory fields (id, login, status)
-            if 'id' in scim_user and 'login' in scim_user and 'status' in scim_user:
-                perun_id = str(scim_user['id'])
-                elixir_id = str(scim_user['login'])
-                enabled = str(scim_user['status']) == 'VALID'
-                email = None
-                if self.store_email and 'mail' in scim_user:
-                    email = str(scim_user['mail'])
-
-                # user already registered in keystone
-                if perun_id in user_map:
-                    # check if user data changed
-                    user = user_map[perun_id]
-                    if not (user['perun_id'] == perun_id
-                            and user['elixir_id'] == elixir_id
-                            and user['email'] == email
-                            and user['enabled'] == enabled):
-                        # update user ...
-                        self.keystone.users_update(perun_id, elixir_id=elixir_id, email=email, enabled=enabled)
-                        # ... and log to update log
-                        self.log2.info(
-                            f"user [{perun_id},{elixir_id}]: update and {'enabled' if enabled else 'disabled'}")
-                else:
-                    # register user ...
-                    self.keystone.users_create(elixir_id, perun_id, email=email, enabled=enabled)
-                    # ... and log to update log
-                    self.log2.info(f"user [{perun_id},{elixir_id}]: create and {'enabled' if enabled else 'disabled'}")
+        Stream the projects of the given file (in the given mode) as normalized projects (see Planner).
+        Projects without mandatory fields are skipped.
 
-                # add perun_id to temporary list
-                user_ids.append(perun_id)
+        :param groups_path: Path to project data (must be in json format)
+        :return: generator of normalized projects
+        '''
+        if self.mode == "scim":
+            normalize = self._normalize_scim_project
+        elif self.mode == "denbi_portal_compute_center":
+            normalize = self._normalize_dpcc_project
+        else:
+            raise ValueError("Unknown/Unsupported mode!")
+        return filter(None, map(normalize, iter_json(groups_path)))
 
-            else:
-                # otherwise ignore user
-                pass
-
-        # Now we have to check if some keystone user entries must be deleted
-        del_users = set(user_ids) ^ set(user_map.keys())
-
-        for id in del_users:
-            self.keystone.users_delete(id)
-            self.log2.info(f"user {id}: deleted")
-
-    def __import_scim_projectdata__(self, json_obj):
-
-        # get current project_map from keystone
-        project_map = self.keystone.projects_map()
-        project_ids = []
-
-        # convert scim json to keystone compatible hash
-        for scim_project in json_obj:
-
-            if 'id' in scim_project and 'members' in scim_project:
-                perun_id = str(scim_project['id'])
-                name = str(scim_project['name'])
-                members = []
-                for m in scim_project['members']:
-                    members.append(m['userId'])
-
-                # if project already registered in keystone
-                if perun_id in project_map:
-                    # check if project data changed
-                    project = project_map[perun_id]
-
-                    if set(project['members']) != set(members):
-                        # Update project ...
-                        self.keystone.projects_update(perun_id, members)
-                        # ... and log to update log
-                        self.log2.info(f"project [{perun_id},{name}]: update with members [{','.join(members)}]")
-                else:
-                    # Create project ...
-                    self.keystone.projects_create(perun_id, name=name, members=members)
-                    # ... and log to update log
-                    self.log2.info(f"project [{perun_id},{name}]: create with members {','.join(members)}")
+    def _normalize_scim_user(self, scim_user):
+        '''
+        Convert a user in scim format to a normalized user (see Planner)
+        :param scim_user:
+        :return: normalized user or None if mandatory fields are missing
+        '''
+        # check for mandatory fields (id, login, status), otherwise ignore user
+        if not ('id' in scim_user and 'login' in scim_user and 'status' in scim_user):
+            return None
+
+        email = None
+        if self.store_email and 'mail' in scim_user:
+            email = str(scim_user['mail'])
+        return {'perun_id': str(scim_user['id']),
+                'elixir_id': str(scim_user['login']),
+                'email': email,
+                'enabled': str(scim_user['status']) == 'VALID'}
+
+    def _normalize_scim_project(self, scim_project):
+        '''
+        Convert a project in scim format to a normalized project (see Planner)
+        :param scim_project:
+        :return: normalized project or None if mandatory fields are missing
+        '''
+        if not ('id' in scim_project and 'members' in scim_project):
+            return None
 
-                project_ids.append(perun_id)
+        return {'perun_id': str(scim_project['id']),
+                'name': str(scim_project['name']),
+                'members': [str(m['userId']) for m in scim_project['members']]}
 
-            else:
-                # otherwise ignore project
-                pass
-
-        del_projects = set(project_ids) ^ set(project_map.keys())
-
-        for id in del_projects:
-            # Delete project ...
-            self.keystone.projects_delete(id)
-            # ... log to update log
-            self.log2.info(f"project [{id}]")
-
-    def __import_dpcc_userdata__(self, json_obj):
-        # get current user_map from keystone
-        user_map = self.keystone.users_map()
-
-        user_ids = []
-
-        # convert denbi_portal_compute_center json to keystone compatible hash
-        for dpcc_user in json_obj:
-            # check for mandatory fields (id, login, status)
-            if 'id' in dpcc_user and 'login-namespace:elixir-persistent' in dpcc_user and 'status' in dpcc_user:
-                perun_id = str(dpcc_user['id'])
-                elixir_id = str(dpcc_user['login-namespace:elixir-persistent'])
-                elixir_name = None
-                if self.support_elixir_name and 'login-namespace:elixir' in dpcc_user:
-                    elixir_name = str(dpcc_user['login-namespace:elixir'])
-                enabled = str(dpcc_user['status']) == 'VALID'
-                email = None
-                if self.store_email and 'preferredMail' in dpcc_user:
-                    email = str(dpcc_user['preferredMail'])
+    def _normalize_dpcc_user(self, dpcc_user):
+        '''
+        Convert a user in denbi_portal_compute_center format to a normalized user (see Planner)
+        :param dpcc_user:
+        :return: normalized user or None if mandatory fields are missing
+        '''
+        # check for mandatory fields (id, login, status), otherwise ignore user
+        if not ('id' in dpcc_user and 'login-namespace:elixir-persistent' in dpcc_user and 'status' in dpcc_user):
+            return None
+
+        perun_id = str(dpcc_user['id'])
+        elixir_id = str(dpcc_user['login-namespace:elixir-persistent'])
+        elixir_name = None
+        if self.support_elixir_name and 'login-namespace:elixir' in dpcc_user:
+            elixir_name = str(dpcc_user['login-namespace:elixir'])
+        email = None
+        if self.store_email and 'preferredMail' in dpcc_user:
+            email = str(dpcc_user['preferredMail'])
+        ssh_key = None
+        if self.support_ssh_key and \
+                'sshPublicKey' in dpcc_user and \
+                dpcc_user['sshPublicKey'] is not None and \
+                len(dpcc_user['sshPublicKey']) > 0:
+            ssh_key = str(dpcc_user['sshPublicKey'][0])
+            # block import of potentially leaked user SSH keys (matches substrings too)
+            if any(blocked_key in ssh_key for blocked_key in self.ssh_key_blocklist):
+                self.log2.info(f"user [{perun_id},{elixir_id}]: ssh key blocked: {ssh_key}")
                 ssh_key = None
-                if self.support_ssh_key and \
-                        'sshPublicKey' in dpcc_user and \
-                        dpcc_user['sshPublicKey'] is not None and \
-                        len(dpcc_user['sshPublicKey']) > 0:
-                    ssh_key = str(dpcc_user['sshPublicKey'][0])
-                    # block import of potentially leaked user SSH keys (matches substrings too)
-                    if any(blocked_key in ssh_key for blocked_key in self.ssh_key_blocklist):
-                        self.log2.info(f"user [{perun_id},{elixir_id}]: ssh key blocked: {ssh_key}")
-                        ssh_key = None
-
-                # user already registered in keystone
-                if perun_id in user_map:
-                    # check if user data changed
-                    user = user_map[perun_id]
-                    if not (user['perun_id'] == perun_id
-                            and user['elixir_id'] == str(elixir_id)
-                            and user['elixir_name'] == str(elixir_name)
-                            and user['email'] == str(email)
-                            and user['enabled'] == bool(enabled)
-                            and user['ssh_key'] == str(ssh_key)):
-
-                        # update user
-                        self.keystone.users_update(perun_id, elixir_id=elixir_id, elixir_name=elixir_name,
-                                                   ssh_key=ssh_key, email=email, enabled=enabled)
-                        # ... and log to update log
-                        self.log2.info(
-                            f"user [{perun_id},{elixir_id}]: update and {'enabled' if enabled else 'disabled'}")
-                else:
-                    # register user ...
-                    self.keystone.users_create(elixir_id, perun_id, elixir_name=elixir_name, email=email,
-                                               ssh_key=ssh_key, enabled=enabled)
-                    # ... and log to update log
-                    self.log2.info(f"user [{perun_id},{elixir_id}]: create and {'enabled' if enabled else 'disabled'}")
-
-                # add perun_id to temporary list
-                user_ids.append(perun_id)
-            else:
-                # otherwise ignore user
-                pass
-
-        # Now we have to check if some keystone user entries must be deleted
-        del_users = set(user_ids) ^ set(user_map.keys())
-
-        for id in del_users:
-            # delete user ...
-            self.keystone.users_delete(id)
-            # ... and log to update log
-
-            self.log2.info(f"user [{id}]: deleted")
-
-    def __import_dpcc_projectdata__(self, json_obj):
-        # get current project_map from keystone
-        project_map = self.keystone.projects_map()
-        project_ids = []
-
-        # convert scim json to keystone compatible hash
-        for dpcc_project in json_obj:
-
-            if 'id' in dpcc_project and 'denbiProjectMembers' in dpcc_project:
-                perun_id = str(dpcc_project['id'])  # as ascii str
-                name = str(dpcc_project['name'])  # as ascii str
-                description = dpcc_project['description']  # as unicode str
-                # status = str(dpcc_project['denbiProjectStatus'])  # values ?
-                members = []
-                for m in dpcc_project['denbiProjectMembers']:
-                    members.append(str(m['id']))  # as ascii str
-
-                # if project already registered in keystone
-                if perun_id in project_map:
-                    # check if project data changed
-                    project = project_map[perun_id]
-
-                    if set(project['members']) != set(members) or \
-                            project['name'] != name or \
-                            'description' in project and project['description'] != description:
-                        # Update project ...
-                        self.keystone.projects_update(perun_id, members=members, name=name, description=description)
-                        # ... and log to update logger
-                        self.log2.info(f"project [{perun_id},{name}]: update with {','.join(members)}")
-
-                    # check for quotas and update it if possible
-                    if self.support_quotas:
-                        if self.read_only:
-                            self.log.info(f"project [{perun_id},{name}]: not setting quotas in  readonly mode.")
-                        else:
-                            self._set_quotas(project, dpcc_project)
-                else:
-                    # create project ...
-                    project = self.keystone.projects_create(perun_id, name=name, description=description,
-                                                            members=members)
-                    # ... and log to update logger
-                    self.log2.info(f"project [{perun_id},{name}]: create with members {','.join(members)}")
-
-                    # check for quotas and update it if possible
-                    if self.support_quotas:
-                        if self.read_only:
-                            self.log.info(f"project [{perun_id},{name}]: not setting quotas in  readonly mode.")
-                        else:
-                            self._set_quotas(project, dpcc_project)
-                    # create router
-                    if self.support_router:
-                        self._create_router(project, not (self.support_network))
-                    # adjust default security group
-                    if self.support_default_ssh_sgrule:
-                        self._add_ssh_sgrule(project["id"])
 
-                project_ids.append(perun_id)
+        return {'perun_id': perun_id,
+                'elixir_id': elixir_id,
+                'elixir_name': elixir_name,
+                'email': email,
+                'ssh_key': ssh_key,
+                'enabled': str(dpcc_user['status']) == 'VALID'}
 
-            else:
-                # otherwise ignore project
-                pass
+    def _normalize_dpcc_project(self, dpcc_project):
+        '''
+        Convert a project in denbi_portal_compute_center format to a normalized project (see Planner)
+        :param dpcc_project:
+        :return: normalized project or None if mandatory fields are missing
+        '''
+        if not ('id' in dpcc_project and 'denbiProjectMembers' in dpcc_project):
+            return None
+
+        return {'perun_id': str(dpcc_project['id']),  # as ascii str
+                'name': str(dpcc_project['name']),  # as ascii str
+                'description': dpcc_project['description'],  # as unicode str
+                'members': [str(m['id']) for m in dpcc_project['denbiProjectMembers']],  # as ascii str
+                'quotas': {name: dpcc_project[name] for name in self.DENBI_OPENSTACK_QUOTA_MAPPING
+                           if name in dpcc_project}}
+
+    def apply_plan(self, plan):
+        '''
+        Apply a plan computed by the planner to Keystone.
+
+        The plan is applied group by group, so that users and projects exist before
+        memberships, quotas and networks are set. Changes within a group run in parallel
+        if more than one worker is configured.
+
+        Projects whose quotas could not be set completely are added to plan.incomplete.
+
+        :param plan: plan to be applied
+        :return:
+        '''
+        self._run_parallel([functools.partial(self._apply_user_create, change) for change in plan.user_creates]
+                           + [functools.partial(self._apply_user_update, change) for change in plan.user_updates]
+                           + [functools.partial(self._apply_user_delete, change) for change in plan.user_deletes])
+
+        self._run_parallel([functools.partial(self._apply_project_create, change) for change in plan.project_creates]
+                           + [functools.partial(self._apply_project_update, change) for change in plan.project_updates]
+                           + [functools.partial(self._apply_project_delete, change) for change in plan.project_deletes])
+
+        self._run_parallel([functools.partial(self._apply_revoke, change) for change in plan.revokes]
+                           + [functools.partial(self._apply_grant, change) for change in plan.grants])
+
+        # load the quotas of all projects to be updated concurrently beforehand
+        self.keystone.quota_factory.prefetch(self.keystone.denbi_project_map[change.project_id]['id']
+                                             for change in plan.quota_updates)
+        self._run_parallel([functools.partial(self._apply_quota_update, change, plan.incomplete)
+                            for change in plan.quota_updates]
+                           + [functools.partial(self._apply_network_provision, change)
+                              for change in plan.network_provisions])
+
+    def _apply_user_create(self, change):
+        # register user ...
+        self.keystone.users_create(change.elixir_id, change.perun_id, elixir_name=change.elixir_name,
+                                   email=change.email, ssh_key=change.ssh_key, enabled=change.enabled)
+        # ... and log to update log
+        self.log2.info(f"user [{change.perun_id},{change.elixir_id}]: create and "
+                       f"{'enabled' if change.enabled else 'disabled'}")
+
+    def _apply_user_update(self, change):
+        # update user ...
+        self.keystone.users_update(change.perun_id, elixir_id=change.elixir_id, elixir_name=change.elixir_name,
+                                   ssh_key=change.ssh_key, email=change.email, enabled=change.enabled)
+        # ... and log to update log
+        self.log2.info(f"user [{change.perun_id},{change.elixir_id}]: update and "
+                       f"{'enabled' if change.enabled else 'disabled'}")
+
+    def _apply_user_delete(self, change):
+        # delete user ...
+        self.keystone.users_delete(change.perun_id)
+        # ... and log to update log
+        self.log2.info(f"user [{change.perun_id}]: deleted")
+
+    def _apply_project_create(self, change):
+        # create project ...
+        self.keystone.projects_create(change.perun_id, name=change.name, description=change.description)
+        # ... and log to update logger
+        self.log2.info(f"project [{change.perun_id},{change.name}]: create")
+
+    def _apply_project_update(self, change):
+        # update project ...
+        self.keystone.projects_update(change.perun_id, name=change.name, description=change.description,
+                                      enabled=change.enabled)
+        # ... and log to update logger
+        self.log2.info(f"project [{change.perun_id},{change.name}]: update")
+
+    def _apply_project_delete(self, change):
+        # delete project ...
+        self.keystone.projects_delete(change.perun_id)
+        # ... and log to update logger
+        self.log2.info(f"project [{change.perun_id}]: deleted")
+
+    def _apply_grant(self, change):
+        self.keystone.projects_append_user(change.project_id, change.user_id)
+        self.log2.info(f"project [{change.project_id}]: append user {change.user_id}")
+
+    def _apply_revoke(self, change):
+        self.keystone.projects_remove_user(change.project_id, change.user_id)
+        self.log2.info(f"project [{change.project_id}]: remove user {change.user_id}")
+
+    def _apply_quota_update(self, change, incomplete):
+        if not self._set_quotas(self.keystone.denbi_project_map[change.project_id], change.quotas, change.check):
+            incomplete.add(change.project_id)
+
+    def _apply_network_provision(self, change):
+        project = self.keystone.denbi_project_map[change.project_id]
+        # create router
+        self._create_router(project, change.router_only)
+        # adjust default security group
+        if change.ssh_sgrule:
+            self._add_ssh_sgrule(project["id"])
 
-        del_projects = set(project_ids) ^ set(project_map.keys())
+    def _run_parallel(self, tasks):
+        '''
+        Run independent tasks using the worker pool and wait until all of them are finished.
 
-        for id in del_projects:
-            # Delete project ...
-            self.keystone.projects_delete(id)
-            # ... and log to update logger
-            self.log2.info(f"project [{id}]: deleted")
+        If more than one worker is configured, the tasks are executed concurrently. The first
+        exception raised by a task is re-raised after all tasks are finished.
 
-    def _set_quotas(self, project, project_definition):
+        :param tasks: list of callables without arguments
+        :return:
+        '''
+        if self.workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                task()
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(task) for task in tasks]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        for error in errors:
+            self.log.error("Task failed: %s", error)
+        if errors:
+            raise errors[0]
+
+    def _set_quotas(self, project, project_definition, check=False):
         '''
         Set/adjust quota for given project
 
+        The propagated de.NBI quotas are remembered for each project. If they did not
+        change since the last successful update, the quota services are not contacted at all
+        unless check is set. Only used to apply a plan, planned quota updates are logged
+        in read-only mode instead (see _apply_or_log).
 
         :param project:
         :param project_definition:
-        :return:
+        :param check: compare the quotas with the quota services even if the propagated quotas did not change
+        :return: True if all propagated quotas are set
         '''
 
-        manager = self.keystone.quota_factory.get_manager(project['id'])
+        denbi_quotas = propagated_quotas(project_definition, self.DENBI_OPENSTACK_QUOTA_MAPPING)
+        if not check and project.get('denbi_quotas', None) == denbi_quotas:
+            self.log.debug(f"project [{project['perun_id']},{project['name']}]:"
+                           f" propagated quotas unchanged, skipping quota check")
+            return True
+
+        # reuse quota manager (and its already loaded quotas) of project map if available, accessing
+        # the quotas of a project record creates its (lazy) quota map on first access
+        try:
+            quota_map = project['quotas']
+        except KeyError:
+            quota_map = None
+        if isinstance(quota_map, QuotaMap):
+            manager = quota_map.manager
+        else:
+            manager = self.keystone.quota_factory.get_manager(project['id'])
+        complete = True
+        # all changes are committed at once, with at most one update per component
+        batch = manager.batch()
+        updates = []
 
         for denbi_quota_name in self.DENBI_OPENSTACK_QUOTA_MAPPING:
             value = project_definition.get(denbi_quota_name, None)
@@ -466,23 +732,36 @@ class Endpoint(object):
                                        f"comparing {current} vs {value}")
                         if manager.check_value(os_quota['name'], value):
                             if manager.get_current_quota(os_quota['name']) != value:
-                                if self.read_only:
-                                    # Log to update logger.
-                                    self.log.info(f"project [{project['perun_id']},{project['name']}]:"
-                                                  f" would update quota {denbi_quota_name} from value {current} to value {value}")
-                                else:
-                                    # Update quota ...
-                                    manager.set_value(os_quota['name'], value)
-                                    # ... and log to update logger
-                                    self.log2.info(f"project [{project['perun_id']},{project['name']}]:"
-                                                   f" update quota {denbi_quota_name} from value {current} to value {value}")
+                                # Stage quota update
+                                batch.stage(os_quota['name'], value)
+                                updates.append((denbi_quota_name, current, value))
                         else:
+                            complete = False
                             self.log.warning(f"project [{project['perun_id']},{project['name']}]:"
                                              f" unable to set quota {denbi_quota_name}s to {value}, would exceed currently used resources,")
                     except ValueError as error:
+                        complete = False
                         self.log.error(f"project [{project['perun_id']},{project['name']}]:"
                                        f" unable to check/set quota {denbi_quota_name}:{str(error)}")
 
+        if updates:
+            try:
+                # Update quotas ...
+                batch.commit()
+                # ... and log to update logger
+                for denbi_quota_name, current, value in updates:
+                    self.log2.info(f"project [{project['perun_id']},{project['name']}]:"
+                                   f" update quota {denbi_quota_name} from value {current} to value {value}")
+            except ValueError as error:
+                complete = False
+                self.log.error(f"project [{project['perun_id']},{project['name']}]:"
+                               f" unable to set quotas:{str(error)}")
+
+        # remember propagated quotas if all of them are set, otherwise check them again next time
+        if complete and project.get('denbi_quotas', None) != denbi_quotas:
+            self.keystone.projects_store_quotas(project['perun_id'], denbi_quotas)
+        return complete
+
     def _create_router(self, project, router_only=False):
         """
         Creates a new router for a project, add a gateway and append optional a network/subnetwork
@@ -0,0 +1,132 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+
+def fingerprint(record):
+    """
+    Return a stable fingerprint (sha256 hex digest) of a normalized user or project record.
+
+    :param record: normalized user or project (see Planner)
+    """
+    if 'members' in record:
+        record = dict(record, members=sorted(record['members']))
+    return hashlib.sha256(json.dumps(record, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class FingerprintStore:
+    """
+    Persistent store of the fingerprints of the last successfully applied user and project records.
+
+    Records whose fingerprint did not change since the last successful run do not need to be
+    compared against Keystone again. Since Keystone may be changed by other means, a full
+    reconciliation (ignoring all stored fingerprints) is forced every `full_reconcile_interval` seconds.
+
+    The store is a json file:
+    ``{context: string, last_full_reconcile: float, users: {perun_id: [fingerprint, id]},
+    projects: {perun_id: [fingerprint, id]}}``
+
+    The context identifies the settings the fingerprints were made with, the stored fingerprints are
+    discarded when the context changes.
+    """
+
+    KINDS = ('users', 'projects')
+
+    def __init__(self, path, full_reconcile_interval=86400, logging_domain='denbi'):
+        """
+        :param path: path of the fingerprint file
+        :param full_reconcile_interval: seconds between two full reconciliations (default is one day),
+                                        0 disables the store
+        :param logging_domain: domain where logs are logged (default is "denbi")
+        """
+        self.log = logging.getLogger(logging_domain)
+        self.path = path
+        self.full_reconcile_interval = full_reconcile_interval
+        self.context = None
+        self.last_full_reconcile = 0
+        self.entries = {kind: {} for kind in self.KINDS}
+
+    def load(self, context):
+        """
+        Load the stored fingerprints made with the given context.
+
+        :param context: string identifying the settings of the current run
+        """
+        self.context = context
+        self.last_full_reconcile = 0
+        self.entries = {kind: {} for kind in self.KINDS}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.log.warning(f"Ignoring unreadable fingerprint file {self.path}: {e}")
+            return
+
+        if data.get('context', None) != context:
+            self.log.info("Settings changed since the last run, discarding stored fingerprints.")
+            return
+        self.last_full_reconcile = data.get('last_full_reconcile', 0)
+        for kind in self.KINDS:
+            self.entries[kind] = data.get(kind, {})
+
+    def full_reconcile_due(self):
+        """
+        Return True if all records have to be compared against Keystone.
+        """
+        return self.full_reconcile_interval <= 0 or \
+            time.time() - self.last_full_reconcile >= self.full_reconcile_interval
+
+    def unchanged(self, kind, record):
+        """
+        Return True if the given record equals the one successfully applied last time.
+
+        :param kind: 'users' or 'projects'
+        :param record: normalized record
+        """
+        entry = self.entries[kind].get(record['perun_id'], None)
+        return entry is not None and entry[0] == fingerprint(record)
+
+    def keystone_id(self, kind, perun_id):
+        """
+        Return the openstack id stored with the record of the given perun id.
+        """
+        return self.entries[kind][perun_id][1]
+
+    def update(self, kind, entries, full_reconcile=False):
+        """
+        Replace the fingerprints of the given kind.
+
+        :param kind: 'users' or 'projects'
+        :param entries: map ``{perun_id: [fingerprint, id]}``
+        :param full_reconcile: the entries are the result of a full reconciliation
+        """
+        self.entries[kind] = entries
+        if full_reconcile:
+            self.last_full_reconcile = time.time()
+
+    def save(self):
+        """
+        Write the fingerprints atomically to the fingerprint file.
+        """
+        data = {'context': self.context, 'last_full_reconcile': self.last_full_reconcile}
+        data.update(self.entries)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
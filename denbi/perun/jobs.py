@@ -0,0 +1,189 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+import threading
+import time
+import uuid
+
+from collections import OrderedDict, deque
+
+
+class QueueFull(Exception):
+    """
+    Raised if a job is submitted to a job queue without free slots.
+    """
+    pass
+
+
+class Job:
+    """
+    A propagation job processed by a JobQueue.
+
+    state is one of 'queued', 'running', 'finished', 'skipped', 'failed' or 'superseded'
+    """
+
+    def __init__(self, args, kwargs, details=None):
+        self.id = uuid.uuid4().hex
+        self.args = args
+        self.kwargs = kwargs
+        self.details = details
+        self.state = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.counts = None
+        self.error = None
+        self.superseded_by = None
+        self.supersedes = []
+
+    def to_dict(self):
+        """
+        Return a json serializable representation of the job.
+        """
+        return {'id': self.id,
+                'state': self.state,
+                'submitted': self.submitted,
+                'started': self.started,
+                'finished': self.finished,
+                'duration': self.finished - self.started if self.finished and self.started else None,
+                'counts': self.counts,
+                'error': self.error,
+                'superseded_by': self.superseded_by,
+                'supersedes': self.supersedes,
+                'details': self.details}
+
+
+class JobQueue:
+    """
+    Bounded queue of jobs processed one after another by a single worker thread.
+
+    The process function is called with the arguments given on submit. It returns the
+    applied plan or None if nothing was done (job state 'skipped').
+
+    If coalescing is enabled, only the latest submitted job is kept waiting (latest wins):
+    a new job supersedes all jobs still waiting, which are discarded without being processed.
+    """
+
+    def __init__(self, process, max_queued=5, max_history=100, coalesce=False, discard=None,
+                 logging_domain='denbi'):
+        """
+        :param process: function processing a job
+        :param max_queued: maximum number of jobs waiting for being processed (default is 5)
+        :param max_history: maximum number of jobs remembered (default is 100)
+        :param coalesce: new jobs supersede all waiting jobs (default is False)
+        :param discard: function called with the arguments of a superseded job (default is None)
+        :param logging_domain: domain where logs are logged (default is "denbi")
+        """
+        self.log = logging.getLogger(logging_domain)
+        self.process = process
+        self.max_queued = max_queued
+        self.max_history = max_history
+        self.coalesce = coalesce
+        self.discard = discard
+        self._pending = deque()
+        self._running = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._worker = threading.Thread(target=self._work, name='job-worker', daemon=True)
+        self._worker.start()
+
+    def submit(self, *args, details=None, **kwargs):
+        """
+        Queue a new job.
+
+        :param details: json serializable details reported with the job (default is None)
+        :return: the queued job
+        :raise QueueFull: if the maximum number of queued jobs is reached
+        """
+        job = Job(args, kwargs, details)
+        with self._lock:
+            if self.coalesce:
+                superseded = list(self._pending)
+                self._pending.clear()
+            elif len(self._pending) >= self.max_queued:
+                raise QueueFull(f"Job queue is full ({self.max_queued} jobs waiting).")
+            else:
+                superseded = []
+            for old_job in superseded:
+                old_job.state = 'superseded'
+                old_job.superseded_by = job.id
+                old_job.finished = time.time()
+                job.supersedes.append(old_job.id)
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            self._forget()
+            self._changed.notify_all()
+
+        for old_job in superseded:
+            self.log.info(f"Job {old_job.id} superseded by job {job.id}.")
+            if self.discard is not None:
+                self.discard(*old_job.args, **old_job.kwargs)
+        return job
+
+    def get(self, job_id):
+        """
+        Return the job with the given id or None.
+        """
+        with self._lock:
+            return self._jobs.get(job_id, None)
+
+    def jobs(self):
+        """
+        Return all remembered jobs, oldest first.
+        """
+        with self._lock:
+            return list(self._jobs.values())
+
+    def join(self):
+        """
+        Block until all queued jobs are processed.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: not self._pending and self._running is None)
+
+    def _forget(self):
+        # drop the oldest completed jobs exceeding the history size
+        for job in list(self._jobs.values()):
+            if len(self._jobs) <= self.max_history:
+                break
+            if job.state not in ('queued', 'running'):
+                del self._jobs[job.id]
+
+    def _work(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._pending)
+                job = self._running = self._pending.popleft()
+            self._run(job)
+            with self._changed:
+                self._running = None
+                self._changed.notify_all()
+
+    def _run(self, job):
+        job.state = 'running'
+        job.started = time.time()
+        self.log.info(f"Job {job.id} started.")
+        try:
+            plan = self.process(*job.args, **job.kwargs)
+            if plan is None:
+                job.state = 'skipped'
+            else:
+                job.counts = plan.counts()
+                job.state = 'finished'
+        except Exception as e:
+            self.log.exception(f"Job {job.id} failed.")
+            job.error = str(e)
+            job.state = 'failed'
+        job.finished = time.time()
+        self.log.info(f"Job {job.id} {job.state}.")
@@ -0,0 +1,103 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from denbi.perun.paging import iter_pages
+
+
+class KeypairIndex:
+    """
+    In-memory index of the ssh keys propagated by Perun (keypairs named 'denbi_by_perun').
+
+    Nova only lists keypairs per user, so the index is built once per sync by querying
+    all users concurrently (bounded by a worker pool) and following Nova's keypair
+    pagination (marker/limit). Afterwards all lookups are served from memory. Users not
+    loaded beforehand are looked up on first access.
+
+    index = ``{user_id: public_key or None}``
+    """
+
+    KEYPAIR_NAME = 'denbi_by_perun'
+
+    def __init__(self, nova, workers=8, page_size=100, logging_domain='denbi'):
+        """
+        Initializes the keypair index
+
+        :param nova: nova client instance (API version 2.35 or higher is needed for pagination)
+        :param workers: maximum number of concurrent requests against nova (default is 8)
+        :param page_size: number of keypairs requested per page (default is 100)
+        :param logging_domain: domain where logs are logged (default is "denbi")
+        """
+        self.log = logging.getLogger(logging_domain)
+        self._nova = nova
+        self._workers = max(int(workers), 1)
+        self._page_size = int(page_size)
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, user_id):
+        """
+        Return the public key of the propagated keypair of the given user or None.
+        """
+        for keypair in iter_pages(self._nova.keypairs.list, self._page_size, lambda keypair: keypair.name,
+                                  user_id=user_id):
+            if keypair.name == self.KEYPAIR_NAME:
+                return keypair.public_key
+        return None
+
+    def load(self, user_ids):
+        """
+        Load the keypairs of the given users into the index.
+
+        :param user_ids: list of openstack user ids
+        """
+        user_ids = list(user_ids)
+        self.log.debug("Loading keypairs of %d users using %d workers.", len(user_ids), self._workers)
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            keys = executor.map(self._fetch, user_ids)
+            index = dict(zip(user_ids, keys))
+        with self._lock:
+            self._index.update(index)
+
+    def get(self, user_id):
+        """
+        Return the public key of the given user or None. Users not loaded yet are
+        requested from nova.
+
+        :param user_id: openstack user id
+        """
+        if user_id not in self._index:
+            key = self._fetch(user_id)
+            with self._lock:
+                self._index[user_id] = key
+        return self._index[user_id]
+
+    def set(self, user_id, public_key):
+        """
+        Update the index after a keypair was created or deleted.
+
+        :param user_id: openstack user id
+        :param public_key: new public key or None if the keypair was deleted
+        """
+        with self._lock:
+            self._index[user_id] = public_key
+
+    def clear(self):
+        """
+        Empty the index.
+        """
+        with self._lock:
+            self._index = {}
@@ -12,12 +12,17 @@
 
 import os
 import itertools
+import json
 import logging
 import yaml
 
+from denbi.perun.keypairs import KeypairIndex
+from denbi.perun.membership import MembershipIndex
+from denbi.perun.paging import DEFAULT_PAGE_SIZE, KeystoneListing, iter_pages
 from denbi.perun.quotas import manager as quotas
+from denbi.perun.records import DenbiProject, DenbiUser, intern
+from denbi.perun.sessions import create_session, pooled_http_session
 from keystoneauth1.identity import v3
-from keystoneauth1 import session
 from keystoneclient.v3 import client as keystone
 from keystoneauth1.exceptions import Unauthorized
 
@@ -34,7 +39,9 @@ class KeyStone:
 
     denbi_user = ``{id: string, elixir_id: string, perun_id: string, email: string, enabled: boolean}``
 
-    denbi_project = ``{id: string, perun_id: string, enabled: boolean, members: [denbi_user]}``
+    denbi_project = ``{id: string, perun_id: string, enabled: boolean, members: {perun_id}}``
+
+    Both are compact DenbiUser/DenbiProject records (see denbi.perun.records) offering dict access.
     """
 
     def __init__(self,
@@ -47,7 +54,16 @@ class KeyStone:
                  logging_domain='denbi',
                  report_domain='report',
                  nested=False,
-                 cloud_admin=True):
+                 cloud_admin=True,
+                 workers=8,
+                 role_assignment_sweep=False,
+                 token_cache=None,
+                 pool_size=None,
+                 group_membership=False,
+                 use_tags=False,
+                 migrate_tags=True,
+                 page_size=DEFAULT_PAGE_SIZE,
+                 quota_cache_ttl=300):
         """
         Create a new Openstack Keystone session reading clouds.yml in ~/.config/clouds.yaml
         or /etc/openstack or using the system environment.
@@ -58,6 +74,8 @@ class KeyStone:
         - OS_PROJECT_NAME
         - OS_USER_DOMAIN_NAME
         - OS_DOMAIN_NAME        (for domain scoped access)
+        - OS_APPLICATION_CREDENTIAL_ID and OS_APPLICATION_CREDENTIAL_SECRET
+                                (instead of username/password, project scoped access only)
 
         Instead of the system variables a "local" environment (a dict) can be explicitly set
 
@@ -71,36 +89,68 @@ class KeyStone:
         :param report_domain: domain where "update" logs are reported (default is "report")
         :param nested: use nested projects instead of cloud/domain admin access
         :param cloud_admin: credentials are cloud admin credentials
+        :param workers: maximum number of concurrent requests (per service) used for bulk reads (default is 8)
+        :param role_assignment_sweep: load project memberships with a single role assignment listing
+                                      instead of one listing per project, lists the assignments of the
+                                      whole cloud (or the parent project in a nested setup) and thus needs
+                                      cloud admin credentials unless nested (default is False)
+        :param token_cache: TokenCache used to reuse tokens of previous processes (default is None)
+        :param pool_size: number of http connections kept open per service, all clients share one
+                          connection pool (default is None - as many as workers, at least 10)
+        :param group_membership: manage project memberships with one keystone group per project, the
+                                 default role is granted once to the group and existing per user
+                                 assignments are migrated into the group (default is False)
+        :param use_tags: mark projects additionally with the flag as keystone tag and list only tagged
+                         projects, users can't be tagged and are still filtered by their flag attribute
+                         (default is False)
+        :param migrate_tags: tag already flagged projects on first projects_map call, which lists all
+                             projects of the target domain once (default is True)
+        :param page_size: number of users/projects requested per page when building the maps, only one
+                          page is kept in memory if keystone supports marker/limit (default is 500)
+        :param quota_cache_ttl: seconds quotas and usage of projects are cached (default is 300, 0 disables the cache)
 
         """
         self.ro = read_only
         self.nested = nested
+        self.role_assignment_sweep = role_assignment_sweep
+        self.group_membership = group_membership
         self.log = logging.getLogger(logging_domain)
         self.log2 = logging.getLogger(report_domain)
 
+        # one connection pool shared by all sessions and clients
+        self._http_session = pooled_http_session(max(int(pool_size or 0), int(workers)))
+
         if cloud_admin:
             # working as cloud admin requires setting a target domain
             if target_domain_name is None:
                 raise Exception("You need to set a target domain if working with cloud admin credentials.")
             # with cloud admin credentials we do not need multiple sessions
             auth = self._create_auth(environ, False)
-            project_session = session.Session(auth=auth)
+            if token_cache:
+                token_cache.load(auth)
+            project_session = create_session(auth, self._http_session)
 
             # create session
             self._project_keystone = keystone.Client(session=project_session)
             self._domain_keystone = self._project_keystone
+            self.parent_project_id = None
 
             try:
                 self.target_domain_id = self._project_keystone.domains.list(name=target_domain_name)[0].id
             except IndexError:
                 raise Exception(f"Unknown domain {target_domain_name}")
+            if token_cache:
+                token_cache.store(auth)
 
         else:
             # use two separate sessions for domain and project access
             domain_auth = self._create_auth(environ, True)
             project_auth = self._create_auth(environ, False)
-            domain_session = session.Session(auth=domain_auth)
-            project_session = session.Session(auth=project_auth)
+            if token_cache:
+                token_cache.load(domain_auth)
+                token_cache.load(project_auth)
+            domain_session = create_session(domain_auth, self._http_session)
+            project_session = create_session(project_auth, self._http_session)
 
             # we have both session, now check the credentials
             # by authenticating to keystone. we also need the AccessInfo
@@ -117,6 +167,9 @@ class KeyStone:
                     project_access = domain_access
             except Unauthorized:
                 raise Exception("Authorization for project session failed, wrong credentials / role?")
+            if token_cache:
+                token_cache.store(domain_auth)
+                token_cache.store(project_auth)
 
             # store both session for later use
             self._domain_keystone = keystone.Client(session=domain_session)
@@ -148,6 +201,13 @@ class KeyStone:
             else:
                 self.parent_project_id = None
 
+        if role_assignment_sweep and not cloud_admin and not self.parent_project_id:
+            # keystone can't filter role assignments by the domain of their project, listing the
+            # assignments of all projects of the cloud is usually reserved to cloud admins
+            self.log.warning("Role assignment sweep needs cloud admin credentials or a nested setup, "
+                             "loading project memberships per project instead.")
+            self.role_assignment_sweep = False
+
         # Check if role exists ...
         self.default_role = str(default_role)
         self.default_role_id = None
@@ -172,15 +232,26 @@ class KeyStone:
             self.log.debug(f"Using existing default role {default_role} (id {self.default_role_id})")
 
         self.flag = flag
+        if use_tags and ('/' in flag or ',' in flag):
+            raise Exception(f"Flag {flag} can't be used as tag, tags must not contain '/' or ','.")
+        self.use_tags = use_tags
+        self.page_size = page_size
+        self._tags_migrated = not migrate_tags
 
         # initialize user and project map
         self.denbi_user_map = {}
         self.__user_id2perun_id__ = {}
         self.denbi_project_map = {}
         self.__project_id2perun_id__ = {}
+        # groups of projects whose memberships are managed by group (perun_id -> group id)
+        self.__project_groups__ = {}
+        self.__group_name2id__ = {}
+        # project memberships (project perun_id -> user perun_ids and vice versa)
+        self._memberships = MembershipIndex()
 
         # initialize the quota factory
-        self._quota_factory = quotas.QuotaFactory(project_session)
+        self._quota_factory = quotas.QuotaFactory(project_session, cache_ttl=quota_cache_ttl, prefetch_workers=workers,
+                                                  logger_domain=logging_domain)
 
         # initialize nova client (minimum needed API version is Train)
         self._nova = nova.Client(version='2.79', session=project_session)
@@ -188,6 +259,10 @@ class KeyStone:
         # initialize neutron client
         self._neutron = neutron.Client(session=project_session)
 
+        # initialize index of propagated ssh keys
+        self.workers = workers
+        self._keypairs = KeypairIndex(self._nova, workers=workers, logging_domain=logging_domain)
+
     @property
     def domain_keystone(self):
         return self._domain_keystone
@@ -245,23 +320,35 @@ class KeyStone:
                         clouds_yaml = yaml.load(stream, Loader=yaml.FullLoader)
                         environ = {}
                         environ['OS_AUTH_URL'] = clouds_yaml['clouds']['openstack']['auth']['auth_url']
-                        environ['OS_USERNAME'] = clouds_yaml['clouds']['openstack']['auth']['username']
-                        environ['OS_PASSWORD'] = clouds_yaml['clouds']['openstack']['auth']['password']
-
-                        environ['OS_PROJECT_NAME'] = clouds_yaml['clouds']['openstack']['auth']['project_name']
-                        environ['OS_USER_DOMAIN_NAME'] = clouds_yaml['clouds']['openstack']['auth']['user_domain_name']
-
-                        # cloud admin
-                        environ['OS_PROJECT_DOMAIN_NAME'] = clouds_yaml['clouds']['openstack']['auth']['project_domain_name'] if 'project_domain_name' in clouds_yaml['clouds']['openstack']['auth'] else clouds_yaml['clouds']['openstack']['auth']['user_domain_name']
-                        # domain admin
-                        environ['OS_DOMAIN_NAME'] = clouds_yaml['clouds']['openstack']['auth']['domain_name'] if 'domain_name' in clouds_yaml['clouds']['openstack']['auth'] else None
+                        if 'application_credential_id' in clouds_yaml['clouds']['openstack']['auth']:
+                            # application credential
+                            environ['OS_APPLICATION_CREDENTIAL_ID'] = clouds_yaml['clouds']['openstack']['auth']['application_credential_id']
+                            environ['OS_APPLICATION_CREDENTIAL_SECRET'] = clouds_yaml['clouds']['openstack']['auth']['application_credential_secret']
+                        else:
+                            environ['OS_USERNAME'] = clouds_yaml['clouds']['openstack']['auth']['username']
+                            environ['OS_PASSWORD'] = clouds_yaml['clouds']['openstack']['auth']['password']
+
+                            environ['OS_PROJECT_NAME'] = clouds_yaml['clouds']['openstack']['auth']['project_name']
+                            environ['OS_USER_DOMAIN_NAME'] = clouds_yaml['clouds']['openstack']['auth']['user_domain_name']
+
+                            # cloud admin
+                            environ['OS_PROJECT_DOMAIN_NAME'] = clouds_yaml['clouds']['openstack']['auth']['project_domain_name'] if 'project_domain_name' in clouds_yaml['clouds']['openstack']['auth'] else clouds_yaml['clouds']['openstack']['auth']['user_domain_name']
+                            # domain admin
+                            environ['OS_DOMAIN_NAME'] = clouds_yaml['clouds']['openstack']['auth']['domain_name'] if 'domain_name' in clouds_yaml['clouds']['openstack']['auth'] else None
 
                     except Exception as e:
                         raise Exception(f"Error parsing/reading clouds.yaml ({clouds_yaml_file}).", e)
 
             else:
                 environ = os.environ
-        if auth_at_domain:
+        if 'OS_APPLICATION_CREDENTIAL_ID' in environ:
+            # application credentials are always bound to a project
+            if auth_at_domain:
+                raise Exception("Application credentials do not support domain scoped access.")
+            auth = v3.ApplicationCredential(auth_url=environ['OS_AUTH_URL'],
+                                            application_credential_id=environ['OS_APPLICATION_CREDENTIAL_ID'],
+                                            application_credential_secret=environ['OS_APPLICATION_CREDENTIAL_SECRET'])
+        elif auth_at_domain:
             # create a domain scoped token
             auth = v3.Password(auth_url=environ['OS_AUTH_URL'],
                                username=environ['OS_USERNAME'],
@@ -321,11 +408,11 @@ class KeyStone:
                                                  elixir_name=str(elixir_name),          # str
                                                  flag=self.flag)                        # str
 
-            denbi_user = {'id': str(os_user.id),
-                          'elixir_id': str(os_user.name),
-                          'perun_id': str(os_user.perun_id),
-                          'enabled': bool(os_user.enabled),
-                          'deleted': False}
+            denbi_user = DenbiUser(id=intern(os_user.id),
+                                   elixir_id=str(os_user.name),
+                                   perun_id=intern(os_user.perun_id),
+                                   enabled=bool(os_user.enabled),
+                                   deleted=False)
 
             if hasattr(os_user, 'email'):
                 denbi_user['email'] = str(os_user.email)
@@ -339,21 +426,22 @@ class KeyStone:
 
             # create keypair for user if set
             if ssh_key:
-                self.nova.keypairs.create(name="denbi_by_perun",
+                self.nova.keypairs.create(name=KeypairIndex.KEYPAIR_NAME,
                                           public_key=ssh_key,
                                           key_type="ssh",
                                           user_id=os_user.id)
+            self._keypairs.set(str(os_user.id), ssh_key if ssh_key else None)
             denbi_user['ssh_key'] = str(ssh_key)
 
         else:
             # Read-only
-            denbi_user = {'id': 'read-only',
-                          'elixir_id': 'read-only@elixir-europe.org',
-                          'perun_id': perun_id,
-                          'enabled': enabled,
-                          'email': str(email),
-                          'ssh_key': str(ssh_key),
-                          'deleted': False}
+            denbi_user = DenbiUser(id='read-only',
+                                   elixir_id='read-only@elixir-europe.org',
+                                   perun_id=intern(perun_id),
+                                   enabled=enabled,
+                                   email=str(email),
+                                   ssh_key=str(ssh_key),
+                                   deleted=False)
 
         # Log keystone update
         self.log2.debug(f"Create user [{denbi_user['elixir_id']},{denbi_user['perun_id']},{denbi_user['id']}].")
@@ -387,17 +475,19 @@ class KeyStone:
             denbi_user = self.denbi_user_map[perun_id]
             # delete user
             if not self.ro:
-                # delete keys
+                # delete all keys of the user, not only the propagated one
                 for keypair in self.nova.keypairs.list(user_id=denbi_user['id']):
                     self.nova.keypairs.delete(key=keypair, user_id=denbi_user['id'])
+                self._keypairs.set(denbi_user['id'], None)
                 # delete users
                 self.keystone.users.delete(denbi_user['id'])
 
             # Log keystone update
             self.log2.debug(f"User [{denbi_user['perun_id']},{denbi_user['elixir_id']}] terminated.")
 
-            # remove entry from map
+            # remove entry from map, keystone removes all role assignments of the user
             del (self.denbi_user_map[perun_id])
+            self._memberships.drop_user(perun_id)
         else:
             raise ValueError(f"User with perun_id {perun_id} not found in user_map.")
 
@@ -445,16 +535,16 @@ class KeyStone:
                 if ssh_key != denbi_user['ssh_key']:
                     # if already a ssh_key named 'denbi_by_perun' is located in database,
                     # we have to remove it beforehand.
-                    for key in self.nova.keypairs.list(user_id=os_user.id):
-                        if key.name == 'denbi_by_perun':
-                            self.nova.keypairs.delete(key, user_id=os_user.id)
-                            break
+                    if self._keypairs.get(str(os_user.id)) is not None:
+                        self.nova.keypairs.delete(KeypairIndex.KEYPAIR_NAME, user_id=os_user.id)
+                        self._keypairs.set(str(os_user.id), None)
                     # if ssh_key is not None, we have to create new keypair
                     if ssh_key is not None:
-                        self.nova.keypairs.create(name="denbi_by_perun",
+                        self.nova.keypairs.create(name=KeypairIndex.KEYPAIR_NAME,
                                                   public_key=ssh_key,
                                                   key_type="ssh",
                                                   user_id=os_user.id)
+                        self._keypairs.set(str(os_user.id), ssh_key)
                     denbi_user['ssh_key'] = ssh_key
 
             self.denbi_user_map[denbi_user['perun_id']] = denbi_user
@@ -468,26 +558,30 @@ class KeyStone:
         else:
             raise ValueError(f'User with perun_id {perun_id} not found in user_map')
 
-    def users_map(self):
+    def users_map(self, ssh_keys_for=None):
         """
         Return a  de.NBI user map {elixir-id -> denbi_user }
 
+        :param ssh_keys_for: perun ids of users whose ssh keys are loaded in advance, the ssh keys
+                             of all other users are loaded on first access (default is None - all users)
+
         :return: a denbi_user map ``{elixir-id: {id:string, elixir_id:string, perun_id:string, email:string, enabled: boolean}}``
         """
         self.denbi_user_map = {}  # clear previous project list
         self.__user_id2perun_id__ = {}
-        for os_user in self.keystone.users.list(domain=self.target_domain_id):
+        for os_user in iter_pages(KeystoneListing(self.keystone.users), self.page_size, domain=self.target_domain_id):
             # consider only correct flagged user
             # any other checks (like for name or perun_id are then not necessary ...
             if hasattr(os_user, "flag") and str(os_user.flag) == self.flag:
                 if not hasattr(os_user, 'perun_id'):
                     raise Exception(f"User ID {os_user.id} should have perun_id")
 
-                denbi_user = {'id': str(os_user.id),                    # str
-                              'perun_id': str(os_user.perun_id),        # str
-                              'elixir_id': str(os_user.name),           # str
-                              'enabled': bool(os_user.enabled),         # boolean
-                              'deleted': bool(getattr(os_user, 'deleted', False))}  # boolean
+                denbi_user = DenbiUser(self._keypairs,
+                                       id=intern(os_user.id),                           # str
+                                       perun_id=intern(os_user.perun_id),               # str
+                                       elixir_id=str(os_user.name),                     # str
+                                       enabled=bool(os_user.enabled),                   # boolean
+                                       deleted=bool(getattr(os_user, 'deleted', False)))  # boolean
 
                 # check for optional attribute email
                 if hasattr(os_user, 'email'):
@@ -501,20 +595,27 @@ class KeyStone:
                 else:
                     denbi_user['elixir_name'] = str(None)
 
-                # check for an propagated ssh-key (named denbi_by_perun)
-                keypairs = self._nova.keypairs.list(user_id=os_user.id)
-                denbi_user['ssh_key'] = str(None)
-                if keypairs:
-                    for keypair in keypairs:
-                        if keypair.name == 'denbi_by_perun':
-                            denbi_user['ssh_key'] = keypair.public_key
-
                 # create entry in maps
                 self.denbi_user_map[denbi_user['perun_id']] = denbi_user
                 self.__user_id2perun_id__[denbi_user['id']] = denbi_user['perun_id']
 
+        # check for propagated ssh-keys (named denbi_by_perun), fetched concurrently for all (requested) users
+        self._keypairs.clear()
+        self.users_load_ssh_keys(self.denbi_user_map.keys() if ssh_keys_for is None else ssh_keys_for)
+
         return self.denbi_user_map
 
+    def users_load_ssh_keys(self, perun_ids):
+        """
+        Load the propagated ssh keys of the given users concurrently into the user map.
+
+        :param perun_ids: perun ids of users, unknown users are ignored
+        """
+        denbi_users = [self.denbi_user_map[perun_id] for perun_id in perun_ids if perun_id in self.denbi_user_map]
+        self._keypairs.load(denbi_user['id'] for denbi_user in denbi_users)
+        for denbi_user in denbi_users:
+            denbi_user['ssh_key'] = str(self._keypairs.get(denbi_user['id']))
+
     def projects_create(self, perun_id, name=None, description=None, members=None, enabled=True):
         """
         Create a new project in the admins user default domain.
@@ -540,28 +641,37 @@ class KeyStone:
                                                        enabled=bool(enabled),
                                                        scratched=False,
                                                        flag=self.flag,
-                                                       parent=self.parent_project_id if self.nested else None)
-            denbi_project = {'id': str(os_project.id),
-                             'name': str(os_project.name),
-                             'perun_id': str(os_project.perun_id),
-                             'description': os_project.description,
-                             'enabled': bool(os_project.enabled),
-                             'scratched': bool(os_project.scratched),
-                             'members': []}
+                                                       parent=self.parent_project_id if self.nested else None,
+                                                       **({'tags': [self.flag]} if self.use_tags else {}),
+                                                       **({'membership': 'group'} if self.group_membership else {}))
+            denbi_project = DenbiProject(id=intern(os_project.id),
+                                         name=str(os_project.name),
+                                         perun_id=intern(os_project.perun_id),
+                                         description=os_project.description,
+                                         enabled=bool(os_project.enabled),
+                                         scratched=bool(os_project.scratched),
+                                         members=self._memberships.set_members(intern(os_project.perun_id), ()),
+                                         quotas=self._quota_map(str(os_project.id)),
+                                         denbi_quotas=None)
         else:
-            denbi_project = {'id': 'read-only-fake',
-                             'name': name,
-                             'perun_id': perun_id,
-                             'description': description,
-                             'enabled': enabled,
-                             'scratched': False,
-                             'members': []}
+            denbi_project = DenbiProject(id='read-only-fake',
+                                         name=name,
+                                         perun_id=intern(perun_id),
+                                         description=description,
+                                         enabled=enabled,
+                                         scratched=False,
+                                         members=self._memberships.set_members(intern(perun_id), ()),
+                                         quotas={},
+                                         denbi_quotas=None)
         # Log keystone update
         self.log2.debug(f"project [{denbi_project['perun_id']},{denbi_project['id']}]: created.")
 
         self.denbi_project_map[denbi_project['perun_id']] = denbi_project
         self.__project_id2perun_id__[denbi_project['id']] = denbi_project['perun_id']
 
+        if self.group_membership and not self.ro:
+            self.__project_groups__[perun_id] = self._project_group(perun_id, denbi_project['id'])
+
         # if a list of  members is given append them to current project
         if members:
             for member in members:
@@ -575,7 +685,7 @@ class KeyStone:
         Update  a project
 
         :param perun_id: perun_id of the project to be modified
-        :param members: list of perun user id
+        :param members: perun ids of all members
         :param name:
         :param description:
         :param enabled:
@@ -584,8 +694,6 @@ class KeyStone:
         :return:
         """
         perun_id = str(perun_id)
-        add = []
-        rem = []
 
         project = self.denbi_project_map[perun_id]
 
@@ -615,21 +723,33 @@ class KeyStone:
 
         # update memberslist
         if members:
+            members = set(members)
             # search for member to be removed or added
-            for m in set(members) ^ set(project["members"]):
-                if m in project["members"]:
-                    # members to remove
-                    rem.append(m)
-                else:
-                    # members to add
-                    add.append(m)
-
-            for m in rem:
+            for m in sorted(project['members'] - members):
                 self.projects_remove_user(perun_id, m)
 
-            for m in add:
+            for m in sorted(members - project['members']):
                 self.projects_append_user(perun_id, m)
 
+    def projects_store_quotas(self, perun_id, denbi_quotas):
+        """
+        Remember the de.NBI quotas last propagated to a project. The values are stored
+        as extra attribute of the project, so that unchanged quotas can be detected without
+        asking the quota services.
+
+        :param perun_id: perun_id of the project
+        :param denbi_quotas: map of propagated de.NBI quota names and values
+        :return:
+        """
+        perun_id = str(perun_id)
+        project = self.denbi_project_map[perun_id]
+
+        if not self.ro:
+            self.keystone.projects.update(project['id'], denbi_quotas=json.dumps(denbi_quotas, sort_keys=True))
+        project['denbi_quotas'] = dict(denbi_quotas)
+
+        self.log2.debug("project [%s,%s]: stored propagated quotas", project['perun_id'], project['id'])
+
     def projects_delete(self, perun_id):
         """
         Disable and tag project as deleted. Since it is dangerous to delete a project completly, the function just
@@ -658,65 +778,240 @@ class KeyStone:
                 # delete project by id in keystone database
                 if not self.ro:
                     self.keystone.projects.delete(denbi_project['id'])
+                    if perun_id in self.__project_groups__:
+                        self.keystone.groups.delete(self.__project_groups__.pop(perun_id))
 
                 # Log keystone update
                 self.log2.info("project [%s,%s]: terminate", denbi_project['perun_id'], denbi_project['name'])
 
                 # delete project from project map
                 del (self.denbi_project_map[denbi_project['perun_id']])
+                self._memberships.drop_project(perun_id)
 
             else:
                 raise ValueError('Project with perun_id %s must be tagged as deleted before terminate!' % perun_id)
         else:
             raise ValueError('Project with perun_id %s not found in project_map!' % perun_id)
 
-    def projects_map(self):
+    def projects_map(self, members_for=None):
         """
         Return a map of projects
 
+        :param members_for: perun ids of projects whose members are loaded in advance, the members
+                            of all other projects are loaded on first access (default is None - all projects)
+
         :return: a map of denbi projects ``{perun_id: {id: string, perun_id: string, enabled: boolean, members: [denbi_users]}}``
         """
         self.denbi_project_map = {}
-        self.__project_id2perun_id_ = {}
+        self.__project_id2perun_id__ = {}
+        self.__project_groups__ = {}
+        self._memberships.clear()
+        if self.group_membership:
+            self.__group_name2id__ = {str(group.name): str(group.id)
+                                      for group in self.keystone.groups.list(domain=self.target_domain_id)}
+
+        # load all memberships of the default role at once if wished
+        if self.role_assignment_sweep:
+            members_index = self._project_members_index()
+
+        migrate_tags = self.use_tags and not self._tags_migrated
+        if self.use_tags and not migrate_tags:
+            # filter projects server side
+            os_projects = iter_pages(KeystoneListing(self.keystone.projects), self.page_size,
+                                     domain=self.target_domain_id, tags=self.flag)
+        else:
+            os_projects = iter_pages(KeystoneListing(self.keystone.projects), self.page_size, domain=self.target_domain_id)
 
-        for os_project in self.keystone.projects.list(domain=self.target_domain_id):
+        tagged = 0
+        for os_project in os_projects:
             if hasattr(os_project, 'flag') and os_project.flag == self.flag:
+                if migrate_tags and self.flag not in getattr(os_project, 'tags', []):
+                    # tag already flagged projects in place
+                    if not self.ro:
+                        self.keystone.projects.add_tag(os_project.id, self.flag)
+                    tagged += 1
                 self.log.debug('Found denbi associated project %s (id %s)',
                                os_project.name, os_project.id)
-                denbi_project = {
-                    'id': str(os_project.id),  # str
-                    'name': str(os_project.name),  # str
-                    'perun_id': str(os_project.perun_id),  # str
-                    'description': os_project.description,  #
-                    'enabled': bool(os_project.enabled),  # bool
-                    'scratched': bool(os_project.scratched),  # bool
-                    'members': [],
-                    'quotas' : {}
-                }
+                # members and quotas are loaded on first access
+                denbi_project = DenbiProject(self._load_project_members, self._quota_map,
+                                             id=intern(os_project.id),  # str
+                                             name=str(os_project.name),  # str
+                                             perun_id=intern(os_project.perun_id),  # str
+                                             description=os_project.description,  #
+                                             enabled=bool(os_project.enabled),  # bool
+                                             scratched=bool(os_project.scratched),  # bool
+                                             denbi_quotas=self._load_denbi_quotas(os_project))
                 # create entry in maps
                 self.__project_id2perun_id__[denbi_project['id']] = denbi_project['perun_id']
                 self.denbi_project_map[denbi_project['perun_id']] = denbi_project
 
-                # get all assigned roles for this project
-                # this call should be possible with domain admin right
-                # include_subtree is necessary since the default policies either
-                # allow domain role assignment query
-                for role in self.keystone.role_assignments.list(project=os_project.id, include_subtree=True):
-                    # if the specified target domain only receives data via the Perun Keystone Adapter
-                    # then only user roles should be in the role assignment list.
-
-                    if hasattr(role,"user") and role.user['id'] in self.__user_id2perun_id__:
-                        self.log.debug('Found user %s as member in project %s', role.user['id'], os_project.name)
-                        denbi_project['members'].append(self.__user_id2perun_id__[role.user['id']])
-                    else:
-                        self.log.warning("Role assignment list contains a non user role assignment!")
-                # add quotas supported by Quota-Manager to current denbi_project
-                project_quota_manager = self._quota_factory.get_manager(os_project.id)
-                for quota_key in project_quota_manager.QUOTA_MAPPING.keys():
-                    denbi_project['quotas'][quota_key] = project_quota_manager.get_current_quota(quota_key)
+                group_name = self._project_group_name(denbi_project['perun_id'])
+                if (self.group_membership and getattr(os_project, 'membership', None) == 'group'
+                        and group_name in self.__group_name2id__):
+                    self.__project_groups__[denbi_project['perun_id']] = self.__group_name2id__[group_name]
+                elif self.group_membership and not self.ro:
+                    # per user assignments are migrated to the project group in place
+                    self._migrate_project(denbi_project)
+
+                if self.role_assignment_sweep:
+                    denbi_project['members'] = self._memberships.set_members(denbi_project['perun_id'],
+                                                                             members_index.get(denbi_project['id'], ()))
+                elif members_for is None or denbi_project['perun_id'] in members_for:
+                    denbi_project['members'] = self._load_project_members(denbi_project['id'])
+
+        if migrate_tags:
+            self.log.info("Tagged %d flagged projects with %s.", tagged, self.flag)
+            # in read-only mode untagged projects remain, keep listing all projects
+            self._tags_migrated = not self.ro or tagged == 0
 
         return self.denbi_project_map
 
+    def _load_project_members(self, project_id):
+        """
+        Helper method loading the members of the given project into the membership index.
+
+        :param project_id: openstack project id
+        :return: the members view of the project
+        """
+        return self._memberships.set_members(self.__project_id2perun_id__[project_id], self._project_members(project_id))
+
+    def _project_members(self, project_id):
+        """
+        Return the perun ids of all members of the given project.
+
+        :param project_id: openstack project id
+        """
+        perun_id = self.__project_id2perun_id__.get(project_id, None)
+        if perun_id in self.__project_groups__:
+            return [self.__user_id2perun_id__[str(os_user.id)]
+                    for os_user in self.keystone.users.list(group=self.__project_groups__[perun_id])
+                    if str(os_user.id) in self.__user_id2perun_id__]
+
+        members = []
+        # get all assigned roles for this project
+        # this call should be possible with domain admin right
+        # include_subtree is necessary since the default policies either
+        # allow domain role assignment query
+        for role in self.keystone.role_assignments.list(project=project_id, include_subtree=True):
+            # if the specified target domain only receives data via the Perun Keystone Adapter
+            # then only user roles should be in the role assignment list.
+
+            if hasattr(role, "user") and role.user['id'] in self.__user_id2perun_id__:
+                self.log.debug('Found user %s as member in project %s', role.user['id'], project_id)
+                members.append(self.__user_id2perun_id__[role.user['id']])
+            elif hasattr(role, "group") and self.group_membership:
+                continue
+            else:
+                self.log.warning("Role assignment list contains a non user role assignment!")
+        return members
+
+    def _quota_map(self, project_id):
+        """
+        Helper method returning the quota map of a project, quotas are requested from the quota services on first access.
+
+        :param project_id: openstack project id
+        """
+        return quotas.QuotaMap(self._quota_factory, project_id)
+
+    def _load_denbi_quotas(self, os_project):
+        """
+        Helper method to read the de.NBI quotas last propagated to a project.
+
+        :param os_project: project as returned by keystone
+
+        :returns: map of de.NBI quota names and values or None if unknown
+        """
+        try:
+            return json.loads(os_project.denbi_quotas)
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def _project_members_index(self):
+        """
+        Helper method to load all assignments of the default role with a single listing
+        and group them by project.
+
+        In a nested setup the listing is limited to the subtree of the parent project,
+        otherwise all assignments of the default role in the cloud are listed (keystone
+        can't filter them by domain, so cloud admin credentials are needed). Only assignments
+        of propagated users are kept, projects outside the target domain are not looked up later. With group based
+        memberships the effective assignments are listed, which resolves group members.
+
+        :returns: a map ``{project_id: set(perun_id)}``
+        """
+        index = {}
+        if self.default_role_id == 'read-only':
+            # read-only mode and default role does not exist yet, so there can't be any assignment
+            return index
+
+        kwargs = {'effective': True} if self.group_membership else {}
+        if self.nested and self.parent_project_id:
+            assignments = self.keystone.role_assignments.list(role=self.default_role_id,
+                                                              project=self.parent_project_id,
+                                                              include_subtree=True,
+                                                              **kwargs)
+        else:
+            assignments = self.keystone.role_assignments.list(role=self.default_role_id, **kwargs)
+
+        for role in assignments:
+            if hasattr(role, "user") and role.user['id'] in self.__user_id2perun_id__:
+                if hasattr(role, "scope") and 'project' in role.scope:
+                    index.setdefault(role.scope['project']['id'], set()).add(self.__user_id2perun_id__[role.user['id']])
+            else:
+                self.log.debug("Ignoring role assignment of default role not belonging to a propagated user.")
+
+        self.log.debug("Loaded memberships of %d projects with a single role assignment listing.", len(index))
+        return index
+
+    def _project_group_name(self, perun_id):
+        """
+        Helper method returning the name of the keystone group holding the members of a project.
+
+        :param perun_id: perun id of the project
+        """
+        return f"{self.flag}_{perun_id}"
+
+    def _project_group(self, perun_id, project_id):
+        """
+        Helper method returning the id of the group of a project. The group is created if
+        it not exists and the default role is granted to the group.
+
+        :param perun_id: perun id of the project
+        :param project_id: openstack id of the project
+        """
+        name = self._project_group_name(perun_id)
+        if name not in self.__group_name2id__:
+            os_group = self.keystone.groups.create(name=name,
+                                                   domain=self.target_domain_id,
+                                                   description=f"Members of project {perun_id} ({self.flag})")
+            self.__group_name2id__[name] = str(os_group.id)
+            self.log2.debug("project [%s,%s]: created group %s", perun_id, project_id, os_group.id)
+        group_id = self.__group_name2id__[name]
+        # granting an already granted role is a no-op
+        self.keystone.roles.grant(role=self.default_role_id, group=group_id, project=project_id)
+        return group_id
+
+    def _migrate_project(self, denbi_project):
+        """
+        Helper method migrating the per user assignments of the default role of a project
+        to the project group. Members are added to the group before their assignment is
+        revoked, so they never lose access. The project is marked as migrated last, an
+        interrupted migration is therefore continued on next run.
+
+        :param denbi_project: denbi project to be migrated
+        """
+        perun_id = denbi_project['perun_id']
+        group_id = self._project_group(perun_id, denbi_project['id'])
+        members = self._project_members(denbi_project['id'])
+        for member in members:
+            uid = self.denbi_user_map[member]['id']
+            self.keystone.users.add_to_group(uid, group_id)
+            self.keystone.roles.revoke(role=self.default_role_id, user=uid, project=denbi_project['id'])
+        self.keystone.projects.update(denbi_project['id'], membership='group')
+        self.__project_groups__[perun_id] = group_id
+        self.log2.info("project [%s,%s]: migrated %d members to group %s",
+                       perun_id, denbi_project['id'], len(members), group_id)
+
     def projects_append_user(self, project_id, user_id):
         """
         Append an user to a project (grant default_role to user/project
@@ -741,9 +1036,12 @@ class KeyStone:
         uid = self.denbi_user_map[user_id]['id']
 
         if not self.ro:
-            self.keystone.roles.grant(role=self.default_role_id, user=uid, project=pid)
+            if project_id in self.__project_groups__:
+                self.keystone.users.add_to_group(uid, self.__project_groups__[project_id])
+            else:
+                self.keystone.roles.grant(role=self.default_role_id, user=uid, project=pid)
 
-        self.denbi_project_map[project_id]['members'].append(user_id)
+        self._memberships.add(self.denbi_project_map[project_id]['perun_id'], self.denbi_user_map[user_id]['perun_id'])
 
         self.log2.debug("project [%s]: append user %s.", project_id, user_id)
 
@@ -771,18 +1069,21 @@ class KeyStone:
         uid = self.denbi_user_map[user_id]['id']
 
         if not self.ro:
-            self.keystone.roles.revoke(role=self.default_role_id, user=uid, project=pid)
+            if project_id in self.__project_groups__:
+                self.keystone.users.remove_from_group(uid, self.__project_groups__[project_id])
+            else:
+                self.keystone.roles.revoke(role=self.default_role_id, user=uid, project=pid)
 
-        self.denbi_project_map[project_id]['members'].remove(user_id)
+        self._memberships.remove(project_id, user_id)
 
         self.log2.debug("project [%s]: remove user %s", project_id, user_id)
 
     def projects_memberlist(self, perun_id):
         """
-        Return a list of members
+        Return the members of a project
 
         :param perun_id: perun id of an project
 
-        :return: Return a list of members
+        :return: Return the (live) set of member perun ids
         """
         return self.denbi_project_map[perun_id]['members']
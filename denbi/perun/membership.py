@@ -0,0 +1,145 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+
+from collections.abc import Set
+
+
+class Members(Set):
+    """
+    Read-only, live set view of the members of a project in a MembershipIndex.
+
+    Members are iterated in the order they were added. Set operations (``-``, ``&``, ``^``, ...)
+    return plain sets.
+    """
+
+    __slots__ = ('_index', '_project_id')
+
+    def __init__(self, index, project_id):
+        self._index = index
+        self._project_id = project_id
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+    def _members(self):
+        return self._index._members.get(self._project_id, {})
+
+    def __contains__(self, user_id):
+        return user_id in self._members()
+
+    def __iter__(self):
+        # iterate over a snapshot, memberships may change meanwhile
+        return iter(tuple(self._members()))
+
+    def __len__(self):
+        return len(self._members())
+
+    def __repr__(self):
+        return f"Members({list(self)!r})"
+
+
+class MembershipIndex:
+    """
+    Index of project memberships with a reverse lookup of the projects of a user. All
+    lookups and updates are O(1), diffs of member sets are plain set operations.
+
+    members = ``{project_id: {user_id}}``, projects = ``{user_id: {project_id}}``
+    """
+
+    def __init__(self):
+        # dicts are used as insertion ordered sets
+        self._members = {}
+        self._projects = {}
+        self._lock = threading.Lock()
+
+    def members(self, project_id):
+        """
+        Return the live view of the members of a project.
+        """
+        return Members(self, project_id)
+
+    def set_members(self, project_id, user_ids):
+        """
+        Replace the members of a project.
+
+        :param project_id: id of the project
+        :param user_ids: ids of all members
+        :return: the live view of the members
+        """
+        with self._lock:
+            self._drop_project(project_id)
+            self._members[project_id] = dict.fromkeys(user_ids)
+            for user_id in self._members[project_id]:
+                self._projects.setdefault(user_id, set()).add(project_id)
+        return Members(self, project_id)
+
+    def add(self, project_id, user_id):
+        """
+        Add a user to the members of a project.
+        """
+        with self._lock:
+            self._members.setdefault(project_id, {})[user_id] = None
+            self._projects.setdefault(user_id, set()).add(project_id)
+
+    def remove(self, project_id, user_id):
+        """
+        Remove a user from the members of a project.
+
+        :raise ValueError: if the user is not a member of the project
+        """
+        with self._lock:
+            try:
+                del self._members[project_id][user_id]
+            except KeyError:
+                raise ValueError(f"User {user_id} is not a member of project {project_id}.")
+            self._projects[user_id].discard(project_id)
+            if not self._projects[user_id]:
+                del self._projects[user_id]
+
+    def projects(self, user_id):
+        """
+        Return the ids of all (loaded) projects the given user is member of.
+        """
+        with self._lock:
+            return set(self._projects.get(user_id, ()))
+
+    def drop_project(self, project_id):
+        """
+        Forget a project and all of its memberships.
+        """
+        with self._lock:
+            self._drop_project(project_id)
+
+    def drop_user(self, user_id):
+        """
+        Forget a user and all of its memberships.
+        """
+        with self._lock:
+            for project_id in self._projects.pop(user_id, ()):
+                self._members[project_id].pop(user_id, None)
+
+    def clear(self):
+        """
+        Forget all memberships.
+        """
+        with self._lock:
+            self._members.clear()
+            self._projects.clear()
+
+    def _drop_project(self, project_id):
+        for user_id in self._members.pop(project_id, ()):
+            self._projects[user_id].discard(project_id)
+            if not self._projects[user_id]:
+                del self._projects[user_id]
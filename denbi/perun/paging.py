@@ -0,0 +1,105 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import urllib.parse
+
+DEFAULT_PAGE_SIZE = 500
+
+
+class IncompleteListing(Exception):
+    """
+    Raised if a listing is truncated by the server and can't be continued with a marker.
+    """
+    pass
+
+
+class Page(list):
+    """
+    Page of a listing, truncated is True if the server reported that further items exist.
+    """
+
+    def __init__(self, items=(), truncated=False):
+        super().__init__(items)
+        self.truncated = truncated
+
+
+class KeystoneListing:
+    """
+    List function for a keystoneclient (v3) manager returning pages with Keystone's truncated flag.
+
+    keystoneclient drops the truncated flag Keystone sets if a listing exceeds its list_limit,
+    so the collection is requested directly.
+
+    for os_user in iter_pages(KeystoneListing(keystone.users), domain=domain_id):
+        ...
+    """
+
+    def __init__(self, manager):
+        """
+        :param manager: keystoneclient manager, e.g. keystone.users
+        """
+        self.manager = manager
+
+    def __call__(self, marker=None, limit=None, domain=None, **filters):
+        params = {name: value for name, value in filters.items() if value is not None}
+        if domain is not None:
+            params['domain_id'] = getattr(domain, 'id', domain)
+        if marker is not None:
+            params['marker'] = marker
+        if limit is not None:
+            params['limit'] = limit
+        url = f"/{self.manager.collection_key}"
+        if params:
+            url += "?" + urllib.parse.urlencode(params, doseq=True)
+        _, body = self.manager.client.get(url)
+        return Page((self.manager.resource_class(self.manager, item, loaded=True)
+                     for item in body[self.manager.collection_key] if item),
+                    truncated=bool(body.get('truncated', False)))
+
+
+def iter_pages(list_function, page_size=DEFAULT_PAGE_SIZE, marker_of=lambda item: item.id, **kwargs):
+    """
+    Iterate over a listing page by page using marker and limit, only one page is kept in memory.
+
+    Servers ignoring limit return everything with the first page. A server ignoring the
+    marker returns the same page again, which then ends the listing. If the server marked
+    this page as truncated (see Page), the listing can't be continued and IncompleteListing
+    is raised instead of silently working on a partial listing.
+
+    for os_user in iter_pages(keystone.users.list, domain=domain_id):
+        ...
+
+    :param list_function: function accepting marker and limit keyword arguments and returning a
+                          list (or Page) of items
+    :param page_size: number of items requested per page (default is 500)
+    :param marker_of: function returning the marker of an item (default is its id)
+    :param kwargs: further arguments passed to the list function
+    :raise IncompleteListing: if the server truncated the listing and repeats a page
+    """
+    marker = None
+    first = None
+    truncated = False
+    while True:
+        page = list_function(marker=marker, limit=page_size, **kwargs)
+        if marker is not None and page and marker_of(page[0]) == first:
+            # the server does not support markers
+            if truncated:
+                raise IncompleteListing("Listing truncated by the server, which does not support markers. "
+                                        "Increase the list limit of the server above the number of items.")
+            return
+        yield from page
+        truncated = getattr(page, 'truncated', False)
+        # a shorter page is the last one, a longer page means the server does not paginate at all
+        if not page or (len(page) != page_size and not truncated):
+            return
+        first = marker_of(page[0])
+        marker = marker_of(page[-1])
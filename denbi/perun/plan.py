@@ -0,0 +1,230 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+
+from collections import namedtuple
+from collections.abc import Set as AbstractSet
+
+# Changes a plan consists of. Users and projects are always referenced by their perun id.
+UserCreate = namedtuple('UserCreate', ['perun_id', 'elixir_id', 'elixir_name', 'email', 'ssh_key', 'enabled'])
+UserUpdate = namedtuple('UserUpdate', ['perun_id', 'elixir_id', 'elixir_name', 'email', 'ssh_key', 'enabled'])
+UserDelete = namedtuple('UserDelete', ['perun_id'])
+ProjectCreate = namedtuple('ProjectCreate', ['perun_id', 'name', 'description'])
+ProjectUpdate = namedtuple('ProjectUpdate', ['perun_id', 'name', 'description', 'enabled'])
+ProjectDelete = namedtuple('ProjectDelete', ['perun_id'])
+Grant = namedtuple('Grant', ['project_id', 'user_id'])
+Revoke = namedtuple('Revoke', ['project_id', 'user_id'])
+QuotaUpdate = namedtuple('QuotaUpdate', ['project_id', 'quotas', 'check'], defaults=(False,))
+NetworkProvision = namedtuple('NetworkProvision', ['project_id', 'router_only', 'ssh_sgrule'])
+
+
+def propagated_quotas(quotas, mapping):
+    """
+    Return the subset of the given de.NBI quotas which are supported by the given mapping.
+
+    :param quotas: map of de.NBI quota names and values
+    :param mapping: map of de.NBI quota names to OpenStack quotas (see Endpoint.DENBI_OPENSTACK_QUOTA_MAPPING)
+    :return: map of supported de.NBI quota names and values
+    """
+    return {name: quotas[name] for name in mapping
+            if mapping[name] is not None and quotas.get(name, None) is not None}
+
+
+class Plan:
+    """
+    List of changes necessary to bring Keystone in line with the propagated data.
+
+    The changes are grouped by kind and in the order they have to be applied.
+    Changes within one group are independent of each other.
+
+    Perun ids of projects whose changes could not be applied completely (e.g. quotas
+    exceeding the used resources) are collected in incomplete while applying the plan,
+    perun ids of projects with ignored (unknown) members in ignored_members while planning.
+    """
+
+    GROUPS = ('user_creates', 'user_updates', 'user_deletes',
+              'project_creates', 'project_updates', 'project_deletes',
+              'revokes', 'grants',
+              'quota_updates', 'network_provisions')
+
+    def __init__(self):
+        for group in self.GROUPS:
+            setattr(self, group, [])
+        self.incomplete = set()
+        self.ignored_members = set()
+
+    @property
+    def complete(self):
+        """
+        True if all changes of the plan are applied completely.
+        """
+        return not self.incomplete
+
+    def __iter__(self):
+        for group in self.GROUPS:
+            yield from getattr(self, group)
+
+    def __len__(self):
+        return sum(len(getattr(self, group)) for group in self.GROUPS)
+
+    def counts(self):
+        """
+        Return the number of changes per group.
+        """
+        return {group: len(getattr(self, group)) for group in self.GROUPS}
+
+
+class Planner:
+    """
+    Compute a plan from normalized Perun data and the current KeyStone maps.
+
+    The planner does not do any I/O, it only compares the given data.
+
+    normalized user = ``{perun_id: string, elixir_id: string, enabled: boolean, email: string,
+    [elixir_name: string, ssh_key: string]}``
+
+    normalized project = ``{perun_id: string, name: string, description: string, members: [perun_id],
+    [quotas: {denbi_quota_name: value}]}``
+
+    Optional fields are only compared if they are part of the normalized data.
+    """
+
+    USER_FIELDS = ('elixir_id', 'elixir_name', 'email', 'ssh_key')
+
+    def __init__(self,
+                 quota_mapping=None,
+                 support_router=False,
+                 support_network=False,
+                 support_default_ssh_sgrule=False,
+                 logging_domain="denbi"):
+        """
+        :param quota_mapping: map of de.NBI quota names to OpenStack quotas, None disables quota support
+        :param support_router: provision a router for new projects
+        :param support_network: provision a network/subnetwork for new projects
+        :param support_default_ssh_sgrule: add a ssh rule to the default security group of new projects
+        :param logging_domain: domain where logs are logged (default is "denbi")
+        """
+        self.quota_mapping = quota_mapping
+        self.support_router = support_router
+        self.support_network = support_network
+        self.support_default_ssh_sgrule = support_default_ssh_sgrule
+        self.log = logging.getLogger(logging_domain)
+
+    def plan(self, users, projects, user_map, project_map, unchanged_users=(), unchanged_projects=(),
+             check_quotas=False):
+        """
+        Compute the complete plan for the given users and projects.
+
+        :param users: iterable of normalized users
+        :param projects: iterable of normalized projects
+        :param user_map: current denbi_user map of KeyStone
+        :param project_map: current denbi_project map of KeyStone
+        :param unchanged_users: perun ids of propagated users known to be up to date (not part of users)
+        :param unchanged_projects: perun ids of propagated projects known to be up to date (not part of projects)
+        :param check_quotas: compare the quotas of all given projects with the quota services, even if the
+                             propagated quotas did not change (default is False)
+        :return: the plan
+        """
+        plan = Plan()
+        known_users = self.plan_users(plan, users, user_map, unchanged_users)
+        self.plan_projects(plan, projects, project_map, known_users, unchanged_projects, check_quotas)
+        return plan
+
+    def plan_users(self, plan, users, user_map, unchanged_users=()):
+        """
+        Add user changes to the given plan.
+
+        :param unchanged_users: perun ids of propagated users known to be up to date
+        :return: set of perun ids of all users existing after the plan is applied
+        """
+        user_ids = set(unchanged_users)
+
+        for user in users:
+            perun_id = user['perun_id']
+            user_ids.add(perun_id)
+            values = [user.get(field, None) for field in self.USER_FIELDS]
+
+            if perun_id in user_map:
+                current = user_map[perun_id]
+                if not (all(current[field] == str(user[field]) for field in self.USER_FIELDS if field in user)
+                        and current['enabled'] == bool(user['enabled'])):
+                    plan.user_updates.append(UserUpdate(perun_id, *values, user['enabled']))
+            else:
+                plan.user_creates.append(UserCreate(perun_id, *values, user['enabled']))
+
+        # users not propagated anymore are deleted (if not already done)
+        for perun_id, current in user_map.items():
+            if perun_id not in user_ids and not (current['deleted'] and not current['enabled']):
+                plan.user_deletes.append(UserDelete(perun_id))
+
+        return user_ids | set(user_map.keys())
+
+    def plan_projects(self, plan, projects, project_map, known_users, unchanged_projects=(), check_quotas=False):
+        """
+        Add project, membership, quota and network changes to the given plan.
+
+        :param known_users: perun ids of all users existing after the plan is applied
+        :param unchanged_projects: perun ids of propagated projects known to be up to date
+        :param check_quotas: add quota checks for projects with unchanged propagated quotas
+        """
+        project_ids = set(unchanged_projects)
+
+        for project in projects:
+            perun_id = project['perun_id']
+            project_ids.add(perun_id)
+
+            members = set()
+            for member in project['members']:
+                if member in known_users:
+                    members.add(member)
+                else:
+                    self.log.warning(f"project [{perun_id},{project['name']}]: ignoring unknown member {member}")
+                    plan.ignored_members.add(perun_id)
+
+            if perun_id in project_map:
+                current = project_map[perun_id]
+                current_members = current['members']
+                if not isinstance(current_members, AbstractSet):
+                    current_members = set(current_members)
+                if current['scratched']:
+                    # project is propagated again, reactivate it
+                    plan.project_updates.append(ProjectUpdate(perun_id, project['name'],
+                                                              project.get('description', None), True))
+                elif current['name'] != project['name'] or \
+                        'description' in project and current.get('description', None) != project['description']:
+                    plan.project_updates.append(ProjectUpdate(perun_id, project['name'],
+                                                              project.get('description', None), None))
+                current_quotas = current.get('denbi_quotas', None)
+            else:
+                current_members = set()
+                plan.project_creates.append(ProjectCreate(perun_id, project['name'], project.get('description', None)))
+                current_quotas = None
+                if self.support_router:
+                    plan.network_provisions.append(NetworkProvision(perun_id, not self.support_network,
+                                                                    self.support_default_ssh_sgrule))
+
+            plan.revokes.extend(Revoke(perun_id, member) for member in sorted(current_members - members))
+            plan.grants.extend(Grant(perun_id, member) for member in sorted(members - current_members))
+
+            if self.quota_mapping is not None and project.get('quotas', None) is not None:
+                quotas = propagated_quotas(project['quotas'], self.quota_mapping)
+                if quotas != current_quotas:
+                    plan.quota_updates.append(QuotaUpdate(perun_id, quotas))
+                elif check_quotas:
+                    # quotas may have been changed in the quota services directly
+                    plan.quota_updates.append(QuotaUpdate(perun_id, quotas, True))
+
+        # projects not propagated anymore are deleted (if not already done)
+        for perun_id, current in project_map.items():
+            if perun_id not in project_ids and not current['scratched']:
+                plan.project_deletes.append(ProjectDelete(perun_id))
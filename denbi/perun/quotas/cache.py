@@ -0,0 +1,93 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class QuotaCache:
+    """
+    Cache of the quotas (limits and usage) of projects shared by all quota managers of a factory.
+
+    Entries are keyed by project and component and expire after ttl seconds. If more
+    than max_size entries are cached, the least recently used ones are evicted.
+
+    cache = ``{(project_id, component): (timestamp, {quota_name: {limit, in_use, reserved}})}``
+
+    The usage (in_use and reserved) is only present once a component loaded it.
+    """
+
+    def __init__(self, ttl=300, max_size=10000):
+        """
+        :param ttl: seconds a cached entry is used (default is 300)
+        :param max_size: maximum number of cached entries (default is 10000)
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, project_id, component):
+        """
+        Return the cached quotas of a project component or None if unknown or expired.
+        """
+        key = (project_id, component)
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, project_id, component, quotas):
+        """
+        Cache the quotas of a project component.
+        """
+        key = (project_id, component)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), quotas)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update(self, project_id, component, limits):
+        """
+        Write new quota limits through to a cached entry (if any), its age is kept.
+
+        :param limits: map of quota names and new limits
+        """
+        with self._lock:
+            entry = self._entries.get((project_id, component), None)
+            if entry is not None:
+                for name, value in limits.items():
+                    if name in entry[1]:
+                        entry[1][name]['limit'] = value
+
+    def flush(self, project_id=None, component=None):
+        """
+        Remove cached entries, all of them or only those of the given project (and component).
+        """
+        with self._lock:
+            if project_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries
+                            if key[0] == project_id and (component is None or key[1] == component)]:
+                    del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
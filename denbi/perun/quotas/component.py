@@ -25,17 +25,17 @@ class QuotaComponentFactory:
     """
 
     @staticmethod
-    def get_component(client, project_id, logger_domain):
+    def get_component(client, project_id, logger_domain, cache=None):
         """
         Return a quota management component for the given client to be
         used with the given project.
         """
         if isinstance(client, neutronClient.Client):
-            return NeutronQuotaComponent(client, project_id, logger_domain)
+            return NeutronQuotaComponent(client, project_id, logger_domain, cache)
         elif isinstance(client, cinderClient.Client):
-            return CinderQuotaComponent(client, project_id, logger_domain)
+            return CinderQuotaComponent(client, project_id, logger_domain, cache)
         elif isinstance(client, novaClient.Client):
-            return NovaQuotaComponent(client, project_id, logger_domain)
+            return NovaQuotaComponent(client, project_id, logger_domain, cache)
         else:
             raise ValueError("Unsupport client " + str(client))
 
@@ -52,19 +52,24 @@ class QuotaComponent:
 
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, client, project_id=None, logger_domain="denbi"):
+    # name of the component, used as key in a shared quota cache
+    NAME = None
+
+    def __init__(self, client, project_id=None, logger_domain="denbi", cache=None):
         """
         Initializes the quota component instance
 
         :param client: the openstack client to use, e.g. an instance of novaclient
         :param project_id: project to query quotas for
         :param logger_domain : domain where logs are logged (default is "denbi")
+        :param cache: QuotaCache shared with other components (default is None - not shared)
         """
 
         self.log = logging.getLogger(logger_domain)
         self._client = client
         self._project_id = project_id
         self._quota_cache = None
+        self._shared_cache = cache
         self._lock = threading.Lock()
 
     def get_value(self, name):
@@ -78,16 +83,78 @@ class QuotaComponent:
         exception.
         """
 
+        self.load()
+        if name in self._quota_cache:
+            return self._quota_cache[name]['limit']
+        raise ValueError("Unknown quota " + name + " in component " + str(self._client))
+
+    def load(self):
+        """
+        Load the quotas of the project if not loaded yet.
+        """
         if self._quota_cache is None:
             # quota is not initialized yet, so get the lock and
             # query all quotas
             with self._lock:
                 if self._quota_cache is None:
-                    self._quota_cache = self._get_cache()
+                    self._quota_cache = self._load_cache()
 
-        if name in self._quota_cache:
-            return self._quota_cache[name]['limit']
-        raise ValueError("Unknown quota " + name + " in component " + str(self._client))
+    def _load_cache(self):
+        """
+        Return the quota limits of the shared cache if available, otherwise request them
+        from the component and add them to the shared cache.
+        """
+        if self._shared_cache is None:
+            return self._get_limits()
+        quotas = self._shared_cache.get(self._project_id, self.NAME)
+        if quotas is None:
+            quotas = self._get_limits()
+            self._shared_cache.put(self._project_id, self.NAME, quotas)
+        return quotas
+
+    def load_usage(self):
+        """
+        Load the amount of currently used (and reserved) resources of all quotas.
+
+        Reading the usage is much more expensive than reading the limits for some
+        components, so it is only requested if needed, e.g. to validate a decreased quota.
+        The usage is merged into the (maybe shared) quota cache.
+        """
+        with self._lock:
+            quotas = self._get_cache()
+            if self._quota_cache is None and self._shared_cache is not None:
+                self._quota_cache = self._shared_cache.get(self._project_id, self.NAME)
+            if self._quota_cache is None:
+                # the usage contains the limits too, no need to request them separately
+                self._quota_cache = {}
+                if self._shared_cache is not None:
+                    self._shared_cache.put(self._project_id, self.NAME, self._quota_cache)
+            for name, quota in quotas.items():
+                if isinstance(quota, dict):
+                    self._quota_cache.setdefault(name, {}).update(quota)
+
+    def snapshot(self):
+        """
+        Return the current limits and usage of all quotas, the usage is always requested.
+
+        :returns: map of quota names and ``{limit, in_use, reserved}``
+        """
+        self.load_usage()
+        return {name: dict(quota) for name, quota in self._quota_cache.items()}
+
+    @staticmethod
+    def _limits(values):
+        """
+        Convert a map of quota names and limits to the format of the quota cache.
+        """
+        return {name: {'limit': value} for name, value in values.items() if name != 'id'}
+
+    @abc.abstractmethod
+    def _get_limits(self):
+        """
+        Method to return the quota cache with the quota values only
+        """
+        return
 
     @abc.abstractmethod
     def _get_cache(self):
@@ -105,8 +172,10 @@ class QuotaComponent:
         :param name: name of the quota to check resource usage for
         :param consider_reserved: also include the reserved resources
         """
-        # retrieve quota value to get the in use values
+        # retrieve quota value to check the name, the usage is loaded on demand
         self.get_value(name)
+        if 'in_use' not in self._quota_cache[name]:
+            self.load_usage()
         if consider_reserved:
             return self._quota_cache[name]['in_use'] + self._quota_cache[name]['reserved']
         else:
@@ -139,8 +208,8 @@ class QuotaComponent:
             # -1 is unrestricted quota.
             return True
 
-        if value > current_quota:
-            # we can always extend the quota
+        if value >= current_quota:
+            # we can always keep or extend the quota
             # if setting the new quota fails, e.g. due to quotas
             # on a parent project in a nested project setup,
             # setting the quota will fail.
@@ -149,8 +218,9 @@ class QuotaComponent:
 
         # we need to check whether the currently used resources
         # exceed the new value
-        self.log.debug("Currently in use for quota %s: %d", name, self.get_in_use(name))
-        return self.get_in_use(name) <= value
+        in_use = self.get_in_use(name)
+        self.log.debug("Currently in use for quota %s: %d", name, in_use)
+        return in_use <= value
 
     def set_quota(self, name, value):
         """
@@ -164,23 +234,45 @@ class QuotaComponent:
         :param value: new value for the quota
 
         """
-        if value is None:
+        self.set_quotas({name: value})
+
+    def set_quotas(self, values):
+        """
+        Sets the given quotas to the given values with a single update.
+
+        All values are checked with check_value before anything is changed. If any
+        check fails, no quota is set and this method throws a ValueError exception.
+        Values that are None or equal to the current quota are skipped.
+
+        :param values: map of quota names and new values
+        """
+        values = {name: value for name, value in values.items() if value is not None}
+        if not values:
             return
-        self.log.debug("Attempt to set quota value %s for quota %s in component %s",
-                       value, name, self._client)
-        if self.check_value(name, value):
-            if self.get_value(name) != value:
-                self._set_new_quota(name, value)
-                self.log.info("Set quota value %s for quota %s in component %s",
-                              value, name, type(self._client))
+        self.log.debug("Attempt to set quota values %s in component %s", values, self._client)
+        invalid = [name for name, value in values.items() if not self.check_value(name, value)]
+        if invalid:
+            raise ValueError("New quota of {} for {} exceed currently used resource amount".format(
+                ", ".join(str(values[name]) for name in invalid), ", ".join(invalid)))
+        changed = {name: value for name, value in values.items() if self.get_value(name) != value}
+        if changed:
+            self._set_new_quotas(changed)
+            self.log.info("Set quota values %s in component %s", changed, type(self._client))
+            for name, value in changed.items():
                 self._quota_cache[name]['limit'] = value
-        else:
-            raise ValueError("New quota of {} for {} exceed currently used resource amount".format(value, name))
+            if self._shared_cache is not None:
+                self._shared_cache.update(self._project_id, self.NAME, changed)
 
-    @abc.abstractmethod
     def _set_new_quota(self, name, value):
         """
-        Abstract method to set a new quota value
+        Set a single new quota value
+        """
+        self._set_new_quotas({name: value})
+
+    @abc.abstractmethod
+    def _set_new_quotas(self, values):
+        """
+        Abstract method to set new quota values with a single update
         """
         return
 
@@ -189,10 +281,12 @@ class QuotaComponent:
 
     def flush(self):
         """
-        Flushes the internal quota cache and enforces a reload on next request.
+        Flushes the internal (and shared) quota cache and enforces a reload on next request.
         """
         with self._lock:
             self._quota_cache = None
+            if self._shared_cache is not None:
+                self._shared_cache.flush(self._project_id, self.NAME)
 
 
 class SimpleQuotaComponent(QuotaComponent):
@@ -201,19 +295,29 @@ class SimpleQuotaComponent(QuotaComponent):
     getting and setting quotas
     """
 
-    def _set_new_quota(self, name, value):
+    def _set_new_quotas(self, values):
         # TODO: the APIs are migrating to a stricter form of
         #       parameter passing (named parameters instead of dict)
         #       how do we do this correctly with the new calls?
-        self._client.quotas.update(self._project_id, **{name: value})
+        self._client.quotas.update(self._project_id, **values)
 
 
 class NovaQuotaComponent(SimpleQuotaComponent):
+    NAME = 'nova'
+
+    def _get_limits(self):
+        return self._limits(self._client.quotas.get(self._project_id).to_dict())
+
     def _get_cache(self):
         return self._client.quotas.get(self._project_id, detail=True).to_dict()
 
 
 class CinderQuotaComponent(SimpleQuotaComponent):
+    NAME = 'cinder'
+
+    def _get_limits(self):
+        return self._limits(self._client.quotas.get(self._project_id).to_dict())
+
     def _get_cache(self):
         return self._client.quotas.get(self._project_id, usage=True).to_dict()
 
@@ -224,6 +328,11 @@ class NeutronQuotaComponent(QuotaComponent):
     quota implementation.
     """
 
+    NAME = 'neutron'
+
+    def _get_limits(self):
+        return self._limits(self._client.show_quota(self._project_id)['quota'])
+
     def _get_cache(self):
         # neutronclient does not provide a simple method to retrieve the
         # quotas and used resource, but we can query the API manually...
@@ -234,6 +343,6 @@ class NeutronQuotaComponent(QuotaComponent):
             quotas[key]['in_use'] = quotas[key].pop('used', None)
         return quotas
 
-    def _set_new_quota(self, name, value):
+    def _set_new_quotas(self, values):
         self._client.update_quota(self._project_id,
-                                  body={'quota': {name: value}})
+                                  body={'quota': dict(values)})
@@ -10,10 +10,17 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import logging
+import threading
+
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait
+
 from novaclient import client as novaClient
 from cinderclient.v3 import client as cinderClient
 from neutronclient.v2_0 import client as neutronClient
 from denbi.perun.quotas import component as component
+from denbi.perun.quotas.cache import QuotaCache
 
 
 class QuotaFactory:
@@ -23,15 +30,27 @@ class QuotaFactory:
     This factory allows you to create quota managers for a given project.
     It hides the internal management of authentication sessions and reduces
     the amount of objects to be passed around in higher level codeself.
+
+    Quotas and usage are cached per project and component by the factory, so all
+    managers created by the factory share them until they expire. The usage is only
+    requested if a decreased quota has to be validated.
     """
 
-    def __init__(self, session):
+    def __init__(self, session, cache_ttl=300, cache_size=10000, prefetch_workers=4, logger_domain="denbi"):
         """
         Initializes the factory
 
         :param session: an initialized OpenStack session to use for the
                         various component clients
+        :param cache_ttl: seconds quotas are cached (default is 300, 0 disables the cache)
+        :param cache_size: maximum number of cached project components (default is 10000)
+        :param prefetch_workers: maximum number of concurrent requests per service while prefetching,
+                                 either a number or a map of service names and numbers (default is 4)
+        :param logger_domain: default is "denbi"
         """
+        self.log = logging.getLogger(logger_domain)
+        self.cache = QuotaCache(cache_ttl, cache_size) if cache_ttl else None
+        self.prefetch_workers = prefetch_workers
 
         self._nova = novaClient.Client(2, session=session, endpoint_type="public")
         self._cinder = cinderClient.Client(2, session=session, endpoint_type="public")
@@ -45,7 +64,111 @@ class QuotaFactory:
 
         """
 
-        return QuotaManager(project_id, self._nova, self._cinder, self._neutron)
+        return QuotaManager(project_id, self._nova, self._cinder, self._neutron, cache=self.cache)
+
+    def get_component(self, service, project_id, cache=True):
+        """
+        Constructs the quota component of a single service for the given project.
+
+        :param service: one of QuotaManager.NOVA, QuotaManager.CINDER or QuotaManager.NEUTRON
+        :param project_id: component is built for the given project and its quotas
+        :param cache: use the quota cache of the factory (default is True)
+        """
+        clients = {QuotaManager.NOVA: self._nova, QuotaManager.CINDER: self._cinder, QuotaManager.NEUTRON: self._neutron}
+        return component.QuotaComponentFactory.get_component(clients[service], project_id, self.log.name,
+                                                             self.cache if cache else None)
+
+    def prefetch(self, project_ids, workers=None):
+        """
+        Load the quota limits of the given projects from all services concurrently into the cache,
+        so managers created afterwards do not need to request them one after another.
+
+        Every service is queried by its own pool of workers, so the prefetch takes about as
+        long as the slowest service needs for all projects. Failed requests are logged and
+        repeated by the managers on demand. Without cache nothing is prefetched.
+
+        :param project_ids: ids of the projects
+        :param workers: maximum number of concurrent requests per service, either a number
+                        or a map of service names and numbers (default is None - prefetch_workers)
+        """
+        if self.cache is None:
+            return
+        project_ids = list(project_ids)
+        if not project_ids:
+            return
+        workers = self.prefetch_workers if workers is None else workers
+
+        executors = []
+        futures = []
+        try:
+            for service in QuotaManager.SERVICES:
+                limit = workers.get(service, 1) if isinstance(workers, dict) else workers
+                executor = ThreadPoolExecutor(max_workers=max(int(limit), 1), thread_name_prefix=f"prefetch-{service}")
+                executors.append(executor)
+                for project_id in project_ids:
+                    futures.append(executor.submit(self.get_component(service, project_id).load))
+            wait(futures)
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+
+        failed = [future.exception() for future in futures if future.exception() is not None]
+        for error in failed[:5]:
+            self.log.warning("Prefetching quotas failed: %s", error)
+        self.log.debug("Prefetched quotas of %d projects (%d requests failed).", len(project_ids), len(failed))
+
+    def flush(self, project_id=None):
+        """
+        Flush the cached quotas of all projects or of the given project.
+        """
+        if self.cache is not None:
+            self.cache.flush(project_id)
+
+
+class QuotaMap(Mapping):
+    """
+    Read-only map of the current quotas of a project ``{quota_name: value}``.
+
+    Nothing is requested from OpenStack until a quota value is accessed for the first
+    time. The underlying quota manager is created once and can be reused for updating
+    the quotas afterwards.
+    """
+
+    __slots__ = ('_factory', '_project_id', '_manager', '_lock')
+
+    def __init__(self, factory, project_id):
+        """
+        Initializes the quota map
+
+        :param factory: quota factory used to create the quota manager on demand
+        :param project_id: the project whose quotas are mapped
+        """
+        self._factory = factory
+        self._project_id = project_id
+        self._manager = None
+        self._lock = threading.Lock()
+
+    @property
+    def manager(self):
+        """
+        Return the quota manager of the project, created on first access.
+        """
+        if self._manager is None:
+            with self._lock:
+                if self._manager is None:
+                    self._manager = self._factory.get_manager(self._project_id)
+        return self._manager
+
+    def __getitem__(self, name):
+        if name not in QuotaManager.QUOTA_MAPPING:
+            raise KeyError(name)
+        return self.manager.get_current_quota(name)
+
+    def __iter__(self):
+        return iter(QuotaManager.QUOTA_MAPPING)
+
+    def __len__(self):
+        return len(QuotaManager.QUOTA_MAPPING)
 
 
 class QuotaManager:
@@ -75,6 +198,7 @@ class QuotaManager:
     NOVA = 'nova'
     CINDER = 'cinder'
     NEUTRON = 'neutron'
+    SERVICES = (NOVA, CINDER, NEUTRON)
     QUOTA_MAPPING = {'cores': NOVA,
                      'fixed_ips': NOVA,
                      'floating_ips': NOVA,
@@ -110,7 +234,7 @@ class QuotaManager:
 
                      'strange_denbi_quota': None}
 
-    def __init__(self, project_id, nova, cinder, neutron, logger_domain="denbi"):
+    def __init__(self, project_id, nova, cinder, neutron, logger_domain="denbi", cache=None):
         """
         Initializes a quota manager for the given project
 
@@ -119,11 +243,12 @@ class QuotaManager:
         :param cinder: cinder client instance
         :param neutron: neutron client instance
         :param logger_domain: default is "denbi"
+        :param cache: QuotaCache shared with other managers (default is None)
 
         """
-        self._components = {self.NOVA: component.QuotaComponentFactory.get_component(nova, project_id, logger_domain),
-                            self.CINDER: component.QuotaComponentFactory.get_component(cinder, project_id, logger_domain),
-                            self.NEUTRON: component.QuotaComponentFactory.get_component(neutron, project_id, logger_domain)}
+        self._components = {self.NOVA: component.QuotaComponentFactory.get_component(nova, project_id, logger_domain, cache),
+                            self.CINDER: component.QuotaComponentFactory.get_component(cinder, project_id, logger_domain, cache),
+                            self.NEUTRON: component.QuotaComponentFactory.get_component(neutron, project_id, logger_domain, cache)}
 
     def _map_to_component(self, name):
         if name in self.QUOTA_MAPPING:
@@ -194,3 +319,75 @@ class QuotaManager:
         component = self._map_to_component(name)
         if component is not None and value is not None:
             component.set_quota(name, value)
+
+    def set_values(self, values):
+        """
+        Sets the given quotas to the given values with at most one update per component.
+
+        :param values: map of quota names and new values
+        """
+        batch = self.batch()
+        for name, value in values.items():
+            batch.stage(name, value)
+        batch.commit()
+
+    def batch(self):
+        """
+        Return a new batch of quota changes for this project, see QuotaBatch.
+        """
+        return QuotaBatch(self)
+
+
+class QuotaBatch:
+    """
+    Transactional batch of quota changes of a project.
+
+    Any number of changes is staged first. On commit all of them are validated against
+    the current quotas and resource usage before anything is changed, then each
+    component (Nova, Cinder, Neutron) is updated with a single call.
+
+    with manager.batch() as batch:
+        batch.stage('cores', 16)
+        batch.stage('ram', 65536)
+    """
+
+    def __init__(self, manager):
+        """
+        :param manager: quota manager of the project
+        """
+        self._manager = manager
+        self._staged = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def stage(self, name, value):
+        """
+        Stage a new value for the given quota, a later value replaces an earlier one.
+
+        If the name is invalid, a ValueError exception is thrown. Unimplemented quotas
+        and None values are ignored.
+
+        :param name: name of the quota to set
+        :param value: new value of the quota
+        """
+        quota_component = self._manager._map_to_component(name)
+        if quota_component is not None and value is not None:
+            self._staged.setdefault(quota_component, {})[name] = value
+
+    def commit(self):
+        """
+        Validate and apply all staged changes. If any value exceeds the currently used
+        resources, nothing is changed and a ValueError exception is thrown.
+        """
+        invalid = [f"{name}={value}" for quota_component, values in self._staged.items()
+                   for name, value in values.items() if not quota_component.check_value(name, value)]
+        if invalid:
+            raise ValueError("New quotas exceed currently used resource amount: " + ", ".join(invalid))
+        for quota_component, values in self._staged.items():
+            quota_component.set_quotas(values)
+        self._staged = {}
@@ -0,0 +1,194 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import csv
+import itertools
+import json
+import logging
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from denbi.perun.quotas.manager import QuotaManager
+
+# columns of a snapshot row, one row per project and quota
+FIELDS = ('project_id', 'perun_id', 'project_name', 'service', 'quota', 'limit', 'in_use', 'reserved')
+FORMATS = ('jsonl', 'csv')
+
+
+class SnapshotProgress:
+    """
+    Ids of the projects already exported, kept in a file (one id per line) to resume an interrupted export.
+
+    Ids are appended and flushed one by one, so the file is valid whenever the export is interrupted.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the progress file, created if it not exists
+        """
+        self.path = path
+        self.project_ids = set()
+        try:
+            with open(path) as f:
+                self.project_ids.update(line.strip() for line in f if line.strip())
+        except FileNotFoundError:
+            pass
+        self._file = open(path, 'a')
+
+    def __contains__(self, project_id):
+        return project_id in self.project_ids
+
+    def __len__(self):
+        return len(self.project_ids)
+
+    def add(self, project_id):
+        """
+        Mark the given project as exported.
+        """
+        self.project_ids.add(project_id)
+        self._file.write(f"{project_id}\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _rows(project, quotas):
+    for service in QuotaManager.SERVICES:
+        for name, quota in sorted(quotas[service].items()):
+            yield {'project_id': project['id'],
+                   'perun_id': project['perun_id'],
+                   'project_name': project['name'],
+                   'service': service,
+                   'quota': name,
+                   'limit': quota.get('limit', None),
+                   'in_use': quota.get('in_use', None),
+                   'reserved': quota.get('reserved', None)}
+
+
+def sweep_quotas(factory, projects, workers=4, chunk_size=200, logger_domain="denbi"):
+    """
+    Read the quotas and usage of the given projects from all services concurrently.
+
+    Every service is queried by its own pool of workers. Projects are swept in chunks, so only
+    the results of one chunk are kept in memory. The quota cache of the factory is bypassed,
+    the usage is always requested.
+
+    for project, rows in sweep_quotas(keystone.quota_factory, keystone.projects_map().values()):
+        ...
+
+    :param factory: QuotaFactory used to create the quota components
+    :param projects: iterable of projects, maps with at least id, perun_id and name
+    :param workers: maximum number of concurrent requests per service, either a number
+                    or a map of service names and numbers (default is 4)
+    :param chunk_size: number of projects swept at once (default is 200)
+    :param logger_domain: domain where logs are logged (default is "denbi")
+    :returns: generator of (project, rows) in the order the projects are completed, rows is a
+              list of maps with FIELDS or None if reading the quotas of the project failed
+    """
+    log = logging.getLogger(logger_domain)
+    executors = {}
+    try:
+        for service in QuotaManager.SERVICES:
+            limit = workers.get(service, 1) if isinstance(workers, dict) else workers
+            executors[service] = ThreadPoolExecutor(max_workers=max(int(limit), 1),
+                                                    thread_name_prefix=f"snapshot-{service}")
+
+        projects = iter(projects)
+        while True:
+            chunk = list(itertools.islice(projects, chunk_size))
+            if not chunk:
+                return
+            futures = {}
+            for index, project in enumerate(chunk):
+                for service, executor in executors.items():
+                    quota_component = factory.get_component(service, project['id'], cache=False)
+                    futures[executor.submit(quota_component.snapshot)] = (index, service)
+
+            results = [{} for _ in chunk]
+            for future in as_completed(futures):
+                index, service = futures[future]
+                try:
+                    results[index][service] = future.result()
+                except Exception as e:
+                    log.warning("Reading %s quotas of project %s failed: %s", service, chunk[index]['id'], e)
+                    results[index][service] = None
+                if len(results[index]) == len(executors):
+                    quotas, results[index] = results[index], None
+                    if None in quotas.values():
+                        yield chunk[index], None
+                    else:
+                        yield chunk[index], list(_rows(chunk[index], quotas))
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+
+
+def export_snapshot(factory, projects, output, output_format='jsonl', progress=None, write_header=True,
+                    workers=4, logger_domain="denbi"):
+    """
+    Stream the quotas (limit, in_use and reserved) of the given projects to output as JSON lines or CSV.
+
+    The rows of a project are written once all its quotas are read. Projects listed in the
+    progress are skipped and exported projects are added to it, so an interrupted export is
+    resumed by running it again with the same progress and output (opened for appending).
+    Only the rows of projects written at the time of the interruption may appear twice.
+    Projects whose quotas can't be read are logged and not written, a resumed export retries them.
+
+    :param factory: QuotaFactory used to create the quota components
+    :param projects: iterable of projects, maps with at least id, perun_id and name
+    :param output: text file the rows are written to
+    :param output_format: 'jsonl' or 'csv' (default is 'jsonl')
+    :param progress: SnapshotProgress of the export (default is None - not resumable)
+    :param write_header: write the CSV header line (default is True)
+    :param workers: maximum number of concurrent requests per service (default is 4)
+    :param logger_domain: domain where logs are logged (default is "denbi")
+    :returns: tuple of the number of exported and failed projects
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unsupported snapshot format {output_format}, use one of {', '.join(FORMATS)}.")
+    log = logging.getLogger(logger_domain)
+
+    if output_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=FIELDS)
+        if write_header:
+            writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            output.write(json.dumps(row) + "\n")
+
+    if progress is not None:
+        log.info("Skipping %d already exported projects.", len(progress))
+        projects = (project for project in projects if project['id'] not in progress)
+
+    exported = 0
+    failed = 0
+    for project, rows in sweep_quotas(factory, projects, workers=workers, logger_domain=logger_domain):
+        if rows is None:
+            failed += 1
+            continue
+        for row in rows:
+            write(row)
+        output.flush()
+        if progress is not None:
+            progress.add(project['id'])
+        exported += 1
+        if exported % 1000 == 0:
+            log.info("Exported quotas of %d projects.", exported)
+    return exported, failed
@@ -0,0 +1,132 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import sys
+
+from collections.abc import MutableMapping
+
+
+def intern(value):
+    """
+    Return the interned string representation of the given value, equal ids share one string object.
+    """
+    return sys.intern(str(value))
+
+
+class Record(MutableMapping):
+    """
+    Compact record with a fixed set of fields stored in slots instead of a per instance dict.
+
+    A record behaves like a dict restricted to its FIELDS. Fields not set yet are
+    missing (KeyError), subclasses may load them on access by overriding __missing__.
+    As for dicts, get and ``in`` never call __missing__.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, values=(), **kwargs):
+        for key, value in dict(values, **kwargs).items():
+            self[key] = value
+
+    def __missing__(self, key):
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            return self.__missing__(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in self.FIELDS or not hasattr(self, key):
+            raise KeyError(key)
+        delattr(self, key)
+
+    def __iter__(self):
+        return (key for key in self.FIELDS if hasattr(self, key))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        return key in self.FIELDS and hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.FIELDS else default
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class DenbiUser(Record):
+    """
+    denbi_user = ``{id: string, elixir_id: string, perun_id: string, elixir_name: string, email: string,
+    enabled: boolean, deleted: boolean, ssh_key: string}``
+
+    The ssh key is looked up in the given keypair index on first access if not set.
+    """
+
+    FIELDS = ('id', 'perun_id', 'elixir_id', 'elixir_name', 'email', 'enabled', 'deleted', 'ssh_key')
+    __slots__ = FIELDS + ('_keypairs',)
+
+    def __init__(self, keypairs=None, values=(), **kwargs):
+        """
+        :param keypairs: KeypairIndex used to load the ssh key (default is None - no lazy loading)
+        :param values: initial field values
+        """
+        self._keypairs = keypairs
+        super().__init__(values, **kwargs)
+
+    def __missing__(self, key):
+        if key != 'ssh_key' or self._keypairs is None:
+            raise KeyError(key)
+        self.ssh_key = str(self._keypairs.get(self.id))
+        return self.ssh_key
+
+
+class DenbiProject(Record):
+    """
+    denbi_project = ``{id: string, perun_id: string, name: string, description: string, enabled: boolean,
+    scratched: boolean, members: [perun_id], quotas: QuotaMap, denbi_quotas: dict}``
+
+    Members and quotas are created by the given functions on first access if not set.
+    """
+
+    FIELDS = ('id', 'perun_id', 'name', 'description', 'enabled', 'scratched', 'members', 'quotas', 'denbi_quotas')
+    __slots__ = FIELDS + ('_load_members', '_load_quotas')
+
+    def __init__(self, load_members=None, load_quotas=None, values=(), **kwargs):
+        """
+        :param load_members: function returning the members for a project id (default is None - no lazy loading)
+        :param load_quotas: function returning the quota map for a project id (default is None - no lazy loading)
+        :param values: initial field values
+        """
+        self._load_members = load_members
+        self._load_quotas = load_quotas
+        super().__init__(values, **kwargs)
+
+    def __missing__(self, key):
+        if key == 'members' and self._load_members is not None:
+            self.members = self._load_members(self.id)
+            return self.members
+        if key == 'quotas' and self._load_quotas is not None:
+            self.quotas = self._load_quotas(self.id)
+            return self.quotas
+        raise KeyError(key)
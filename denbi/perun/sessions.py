@@ -0,0 +1,49 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import requests
+
+from keystoneauth1 import session
+
+# urllib3 default pool size, used as lower bound
+DEFAULT_POOL_SIZE = 10
+
+
+def pooled_http_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Return a requests session keeping up to pool_size connections (with TCP keep-alive) per host open.
+
+    One http session should be shared by all keystoneauth sessions (and therefore all
+    Keystone, Nova, Neutron and Cinder clients) of a process, so established connections
+    are reused by all of them.
+
+    :param pool_size: number of connections kept per host, should match the number of concurrent requests
+    """
+    pool_size = max(int(pool_size), DEFAULT_POOL_SIZE)
+    http_session = requests.Session()
+    for prefix in ('https://', 'http://'):
+        http_session.mount(prefix, session.TCPKeepAliveAdapter(pool_connections=DEFAULT_POOL_SIZE,
+                                                               pool_maxsize=pool_size))
+    return http_session
+
+
+def create_session(auth, http_session=None, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Return a keystoneauth session for the given auth plugin using the given (or a new pooled) http session.
+
+    :param auth: keystoneauth identity plugin
+    :param http_session: shared requests session (default is None - create a new one)
+    :param pool_size: pool size of a newly created http session
+    """
+    if http_session is None:
+        http_session = pooled_http_session(pool_size)
+    return session.Session(auth=auth, session=http_session)
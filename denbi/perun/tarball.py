@@ -0,0 +1,77 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import io
+import os
+import tarfile
+
+
+class PerunTarball:
+    """
+    Read access to the users.scim and groups.scim members of a tarball propagated by Perun.
+
+    The members are read directly from the gzip stream, nothing is extracted to disk
+    and all other members are ignored.
+
+    with PerunTarball(path) as tarball:
+        endpoint.import_data(tarball.open('users.scim'), tarball.open('groups.scim'))
+    """
+
+    MEMBERS = ('users.scim', 'groups.scim')
+
+    def __init__(self, path):
+        """
+        :param path: path of the (gzip compressed) tarball
+        :raise ValueError: if users.scim or groups.scim is missing
+        """
+        self.path = path
+        self._tar = tarfile.open(path, "r:gz")
+        self._members = {}
+        for member in self._tar:
+            name = os.path.basename(member.name)
+            if member.isfile() and name in self.MEMBERS:
+                self._members[name] = member
+        missing = [name for name in self.MEMBERS if name not in self._members]
+        if missing:
+            self.close()
+            raise ValueError(f"{path} does not contain {', '.join(missing)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._tar.close()
+
+    def open(self, name):
+        """
+        Return a text file object reading the given member.
+
+        :param name: 'users.scim' or 'groups.scim'
+        """
+        return io.TextIOWrapper(self._tar.extractfile(self._members[name]), encoding='utf-8')
+
+    def digest(self, chunk_size=65536):
+        """
+        Return the digest (sha256) of the content of users.scim and groups.scim.
+        """
+        digests = []
+        for name in sorted(self.MEMBERS):
+            digest = hashlib.sha256()
+            with self._tar.extractfile(self._members[name]) as member:
+                for chunk in iter(lambda: member.read(chunk_size), b''):
+                    digest.update(chunk)
+            digests.append(digest.digest())
+        return hashlib.sha256(b''.join(digests)).hexdigest()
@@ -0,0 +1,86 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import logging
+import os
+import threading
+
+
+class TokenCache:
+    """
+    Persistent cache of keystone tokens shared by subsequent processes.
+
+    Tokens are stored in a json file only readable by its owner, keyed by the cache id of the
+    auth plugin. The cache id covers auth url, user (or application credential), secret and
+    scope. A cached token is reused until it expires within min_validity seconds.
+
+    cache = ``{cache_id: auth_state}``
+    """
+
+    def __init__(self, path, min_validity=300, logging_domain='denbi'):
+        """
+        :param path: path of the cache file
+        :param min_validity: minimum remaining validity (in seconds) of a token to be reused (default is 300)
+        :param logging_domain: domain where logs are logged (default is "denbi")
+        """
+        self.log = logging.getLogger(logging_domain)
+        self.path = path
+        self.min_validity = min_validity
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.log.warning(f"Ignoring unreadable token cache {self.path}: {e}")
+            return {}
+
+    def load(self, auth):
+        """
+        Initialize the given auth plugin with a cached token if available.
+
+        :param auth: keystoneauth identity plugin
+        :return: True if a cached token is used
+        """
+        with self._lock:
+            state = self._read().get(auth.get_cache_id(), None)
+        if state is None:
+            return False
+        auth.set_auth_state(json.dumps(state))
+        if auth.auth_ref is None or auth.auth_ref.will_expire_soon(self.min_validity):
+            auth.invalidate()
+            return False
+        self.log.debug("Using cached token valid until %s.", auth.auth_ref.expires)
+        return True
+
+    def store(self, auth):
+        """
+        Store the current token of the given (authenticated) auth plugin.
+
+        :param auth: keystoneauth identity plugin
+        """
+        state = auth.get_auth_state()
+        if state is None:
+            return
+        with self._lock:
+            cache = self._read()
+            cache[auth.get_cache_id()] = json.loads(state)
+            tmp = f"{self.path}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.fchmod(fd, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp, self.path)
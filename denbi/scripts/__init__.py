@@ -1,11 +1,17 @@
+import functools
 import os
 from keystoneauth1.identity import v3
-from keystoneauth1 import session
 from keystoneclient.v3 import client as keystone
 from novaclient import client as nova
 
+from denbi.perun.sessions import create_session
 
+
+@functools.lru_cache(maxsize=None)
 def obtain_keystone_session():
+    """
+    Return the (pooled) keystone session of this process, it is created on first use.
+    """
     auth = v3.Password(
         auth_url=os.environ['OS_AUTH_URL'],
         username=os.environ['OS_USERNAME'],
@@ -14,7 +20,7 @@ def obtain_keystone_session():
         user_domain_name=os.environ['OS_USER_DOMAIN_NAME'],
         project_domain_name=os.environ['OS_USER_DOMAIN_NAME']
     )
-    return session.Session(auth=auth)
+    return create_session(auth)
 
 
 def obtain_keystone():
@@ -16,12 +16,12 @@
 
 import argparse
 import logging
-import shutil
-import tarfile
-import tempfile
 
 from denbi.perun.endpoint import Endpoint
+from denbi.perun.fingerprint import FingerprintStore
 from denbi.perun.keystone import KeyStone
+from denbi.perun.tarball import PerunTarball
+from denbi.perun.tokens import TokenCache
 
 
 logging.basicConfig(level=logging.WARN)
@@ -34,24 +34,32 @@ def process_tarball(tarball_path, read_only=False, target_domain_name='elixir',
                     support_router=False,
                     external_network_id='',
                     support_network=False,
-                    support_default_ssh_sgrule=False):
+                    support_default_ssh_sgrule=False,
+                    role_assignment_sweep=False,
+                    group_membership=False,
+                    use_tags=False,
+                    migrate_tags=True,
+                    workers=1,
+                    fingerprint_file=None,
+                    full_reconcile_interval=86400,
+                    token_cache_file=None):
     """Process a propagated tarball.
 
-    Should contain at least a user.scim and group.scim file in SCIM format.
+    Should contain at least a user.scim and group.scim file in SCIM format, both are
+    read directly from the tarball.
     """
-    directory = tempfile.mkdtemp()
-
-    # extract tar file
-    tar = tarfile.open(tarball_path, "r:gz")
-    tar.extractall(path=directory)
-    tar.close()
-
     # import into keystone
     keystone = KeyStone(default_role=default_role,
                         create_default_role=True,
                         target_domain_name=target_domain_name,
                         read_only=read_only,
-                        nested=nested)
+                        nested=nested,
+                        role_assignment_sweep=role_assignment_sweep,
+                        group_membership=group_membership,
+                        use_tags=use_tags,
+                        migrate_tags=migrate_tags,
+                        pool_size=workers,
+                        token_cache=TokenCache(token_cache_file) if token_cache_file else None)
     endpoint = Endpoint(keystone=keystone,
                         mode="denbi_portal_compute_center",
                         support_elixir_name=support_elixir_name,
@@ -59,12 +67,13 @@ def process_tarball(tarball_path, read_only=False, target_domain_name='elixir',
                         support_router=support_router,
                         external_network_id=external_network_id,
                         support_network=support_network,
-                        support_default_ssh_sgrule=support_default_ssh_sgrule
+                        support_default_ssh_sgrule=support_default_ssh_sgrule,
+                        workers=workers,
+                        fingerprint_store=FingerprintStore(fingerprint_file, full_reconcile_interval)
+                        if fingerprint_file else None
                         )
-    endpoint.import_data(directory + '/users.scim', directory + '/groups.scim')
-
-    # Cleanup
-    shutil.rmtree(directory)
+    with PerunTarball(tarball_path) as tarball:
+        endpoint.import_data(tarball.open('users.scim'), tarball.open('groups.scim'))
 
 
 def main():
@@ -94,6 +103,24 @@ def main():
                         help="create a network for created project, sets --router")
     parser.add_argument("--ssh_sgrule", action="store_true", default=False,
                         help="create a default ssh rule for default security group, sets --network")
+    parser.add_argument("--role-assignment-sweep", action="store_true", default=False,
+                        help="load project memberships with a single role assignment listing, "
+                             "needs cloud admin credentials unless nested")
+    parser.add_argument("--group-membership", action="store_true", default=False,
+                        help="manage project memberships with one keystone group per project, "
+                             "existing per user role assignments are migrated")
+    parser.add_argument("--use-tags", action="store_true", default=False,
+                        help="tag projects with the flag and list only tagged projects")
+    parser.add_argument("--skip-tag-migration", action="store_true", default=False,
+                        help="do not look for flagged but untagged projects, use if all projects are tagged")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of keystone/openstack modifications running in parallel, defaults to 1")
+    parser.add_argument("--fingerprints", metavar="FILE",
+                        help="only compare users/projects changed since the last run, fingerprints are kept in FILE")
+    parser.add_argument("--full-reconcile-interval", type=int, default=86400,
+                        help="seconds between two runs comparing all users/projects, defaults to 86400")
+    parser.add_argument("--token-cache", metavar="FILE",
+                        help="reuse keystone tokens of previous runs, tokens are kept in FILE (readable by owner only)")
     args = parser.parse_args()
 
     # Defaults to WARN, with every added -v it goes to INFO then DEBUG
@@ -116,7 +143,15 @@ def main():
                     support_router=args.router,
                     external_network_id=args.external_network_id,
                     support_network=args.network,
-                    support_default_ssh_sgrule=args.ssh_sgrule)
+                    support_default_ssh_sgrule=args.ssh_sgrule,
+                    role_assignment_sweep=args.role_assignment_sweep,
+                    group_membership=args.group_membership,
+                    use_tags=args.use_tags,
+                    migrate_tags=not args.skip_tag_migration,
+                    workers=args.workers,
+                    fingerprint_file=args.fingerprints,
+                    full_reconcile_interval=args.full_reconcile_interval,
+                    token_cache_file=args.token_cache)
 
 
 if __name__ == '__main__':
@@ -14,31 +14,34 @@
 
 """Simple Perun propagation service.
 
-Using this service in a real world scenario makes it possibly necessary
-to implement the upload function in a thread. But the 'process_tarball'
-method shouldn't run parallel.
+Uploaded tarballs are queued as jobs and processed one after another
+by a single worker thread, since the 'process_tarball' method shouldn't
+run parallel. The state of the jobs can be requested via '/jobs'.
 """
 
+import hashlib
 import json
 import logging
 import os
 import shutil
 import sys
-import tarfile
 import tempfile
-
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 
 from datetime import datetime
 
 from denbi.perun.endpoint import Endpoint
+from denbi.perun.fingerprint import FingerprintStore
+from denbi.perun.jobs import JobQueue, QueueFull
+from denbi.perun.tarball import PerunTarball
+from denbi.perun.tokens import TokenCache
 from denbi.perun.keystone import KeyStone
 
 from flask import Flask
+from flask import jsonify
 from flask import request
 
-import traceback
-
 # logging formatter
 fmt = logging.Formatter('[%(asctime)s] - (%(name)s/%(levelname)s) - %(message)s')
 
@@ -98,12 +101,56 @@ if app.config.get('SUPPORT_ROUTER', False) and not app.config.get('EXTERNAL_NETW
 if not app.config.get('SSH_KEY_BLOCKLIST', False):
     app.config['SSH_KEY_BLOCKLIST'] = []
 
+if not app.config.get('WORKERS', False):
+    app.config['WORKERS'] = 1
+elif not str(app.config.get('WORKERS')).isdigit() or int(app.config.get('WORKERS')) < 1:
+    report.error(f"Unsupported WORKERS '{app.config.get('WORKERS')}', must be a positive number")
+    sys.exit(4)
+
+if not app.config.get('FULL_RECONCILE_INTERVAL', False):
+    app.config['FULL_RECONCILE_INTERVAL'] = 86400
+elif not str(app.config.get('FULL_RECONCILE_INTERVAL')).isdigit():
+    report.error(f"Unsupported FULL_RECONCILE_INTERVAL '{app.config.get('FULL_RECONCILE_INTERVAL')}',"
+                 f" must be a number of seconds")
+    sys.exit(4)
+
+if app.config.get('FULL_SYNC_MAX_AGE', None) is None:
+    app.config['FULL_SYNC_MAX_AGE'] = 86400
+elif not str(app.config.get('FULL_SYNC_MAX_AGE')).isdigit():
+    report.error(f"Unsupported FULL_SYNC_MAX_AGE '{app.config.get('FULL_SYNC_MAX_AGE')}',"
+                 f" must be a number of seconds")
+    sys.exit(4)
+
+if not app.config.get('MAX_QUEUED_JOBS', False):
+    app.config['MAX_QUEUED_JOBS'] = 5
+elif not str(app.config.get('MAX_QUEUED_JOBS')).isdigit() or int(app.config.get('MAX_QUEUED_JOBS')) < 1:
+    report.error(f"Unsupported MAX_QUEUED_JOBS '{app.config.get('MAX_QUEUED_JOBS')}', must be a positive number")
+    sys.exit(4)
+
+if app.config.get('COALESCE', None) is None:
+    app.config['COALESCE'] = True
+
+if not app.config.get('MAX_UPLOAD_SIZE', False):
+    app.config['MAX_UPLOAD_SIZE'] = 1073741824
+elif not str(app.config.get('MAX_UPLOAD_SIZE')).isdigit():
+    report.error(f"Unsupported MAX_UPLOAD_SIZE '{app.config.get('MAX_UPLOAD_SIZE')}', must be a number of bytes")
+    sys.exit(4)
+
+if app.config.get('MAP_TTL', None) is None:
+    app.config['MAP_TTL'] = 600
+elif not str(app.config.get('MAP_TTL')).isdigit():
+    report.error(f"Unsupported MAP_TTL '{app.config.get('MAP_TTL')}', must be a number of seconds")
+    sys.exit(4)
+
 PKA_KEYS = ('BASE_DIR', 'KEYSTONE_READ_ONLY', 'CLEANUP',
             'TARGET_DOMAIN_NAME', 'DEFAULT_ROLE', 'NESTED',
             'ELIXIR_NAME', 'SUPPORT_QUOTAS', 'SUPPORT_ROUTER',
             'SUPPORT_NETWORK', 'SUPPORT_DEFAULT_SSH_SGRULE',
             'EXTERNAL_NETWORK_ID', 'LOG_DIR', 'LOG_LEVEL',
-            'SSH_KEY_BLOCKLIST')
+            'SSH_KEY_BLOCKLIST', 'ROLE_ASSIGNMENT_SWEEP', 'GROUP_MEMBERSHIP', 'USE_TAGS', 'WORKERS',
+            'FINGERPRINTS', 'FULL_RECONCILE_INTERVAL', 'FULL_SYNC_MAX_AGE',
+            'MAX_QUEUED_JOBS', 'COALESCE', 'MAX_UPLOAD_SIZE', 'MAP_TTL',
+            'TOKEN_CACHE')
 
 config_str_list = []
 config_str_list.append("I'm using the following configuration:")
@@ -119,11 +166,16 @@ report.info('\n'.join(config_str_list))
 # check if minimum set of OS keys is provided.
 local_environment = {}
 
-necessary_keys = ["OS_AUTH_URL",
-                  "OS_USERNAME",
-                  "OS_USER_DOMAIN_NAME",
-                  "OS_PROJECT_NAME",
-                  "OS_PASSWORD"]
+if "OS_APPLICATION_CREDENTIAL_ID" in app.config:
+    necessary_keys = ["OS_AUTH_URL",
+                      "OS_APPLICATION_CREDENTIAL_ID",
+                      "OS_APPLICATION_CREDENTIAL_SECRET"]
+else:
+    necessary_keys = ["OS_AUTH_URL",
+                      "OS_USERNAME",
+                      "OS_USER_DOMAIN_NAME",
+                      "OS_PROJECT_NAME",
+                      "OS_PASSWORD"]
 for key in app.config.keys():
     if key.startswith("OS_"):
         local_environment[key] = app.config.get(key)
@@ -150,9 +202,6 @@ denbi.addHandler(log_ch)
 # adjust 'report' logger Log Level according to pka configuration
 report.setLevel(app.config.get("LOG_LEVEL"))
 
-# Create thread executor
-executor = ThreadPoolExecutor(max_workers=1)
-
 
 def strtobool(val):
     """Convert a string representation of truth to true or false .
@@ -169,10 +218,81 @@ def strtobool(val):
         raise ValueError("invalid truth value %r" % (val,))
 
 
+def last_import(state_path):
+    """
+    Return the state of the last successful import ({digest, context, time}) or an empty dict.
+    """
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def store_last_import(state_path, digest, context):
+    """
+    Remember the digest of a successful import.
+    """
+    tmp = f"{state_path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'digest': digest, 'context': context, 'time': time.time()}, f)
+    os.replace(tmp, state_path)
+
+
+def clear_last_import(state_path):
+    """
+    Forget the last import, e.g. before keystone is changed by a new import.
+    """
+    try:
+        os.unlink(state_path)
+    except FileNotFoundError:
+        pass
+
+
+# keystone tokens are cached in BASE_DIR if wished
+if strtobool(app.config.get('TOKEN_CACHE', "False")):
+    token_cache = TokenCache(app.config.get('BASE_DIR') + "/token_cache.json")
+else:
+    token_cache = None
+
+# KeyStone/Endpoint instances kept between imports, one per configuration
+endpoints = {}
+endpoints_lock = threading.Lock()
+
+
+def get_endpoint(keystone_args, endpoint_args, fingerprint_file=None, full_reconcile_interval=86400):
+    """
+    Return the Endpoint (and its KeyStone) for the given configuration, created on first use.
+
+    Keeping the instances skips authentication, domain and role lookups and client creation
+    for subsequent imports. The keystone sessions renew expired tokens transparently.
+
+    :param keystone_args: KeyStone arguments
+    :param endpoint_args: Endpoint arguments
+    :param fingerprint_file: path of the fingerprint file, None disables fingerprints
+    :param full_reconcile_interval: see FingerprintStore
+    """
+    key = json.dumps([keystone_args, endpoint_args, fingerprint_file, full_reconcile_interval], sort_keys=True)
+    with endpoints_lock:
+        if key not in endpoints:
+            report.info("Creating new keystone connection.")
+            keystone = KeyStone(environ=local_environment, token_cache=token_cache, **keystone_args)
+            fingerprint_store = FingerprintStore(fingerprint_file, full_reconcile_interval) if fingerprint_file else None
+            endpoints[key] = Endpoint(keystone=keystone, fingerprint_store=fingerprint_store, **endpoint_args)
+        return endpoints[key]
+
+
+def invalidate_endpoints():
+    """
+    Drop all kept KeyStone/Endpoint instances (and their maps).
+    """
+    with endpoints_lock:
+        endpoints.clear()
+
+
 def process_tarball(tarball_path,
                     base_dir=tempfile.mkdtemp(),
                     read_only=False,
-                    cleanup=False,
                     target_domain_name='elixir',
                     default_role='user',
                     nested=False,
@@ -182,90 +302,240 @@ def process_tarball(tarball_path,
                     external_network_id='',
                     support_network=False,
                     support_default_ssh_sgrule=False,
-                    ssh_key_blocklist=None):
+                    ssh_key_blocklist=None,
+                    role_assignment_sweep=False,
+                    group_membership=False,
+                    use_tags=False,
+                    workers=1,
+                    fingerprints=False,
+                    full_reconcile_interval=86400,
+                    full_sync_max_age=86400,
+                    map_ttl=0):
     """
-    Process Perun propagated tarball.
+    Process Perun propagated tarball. The propagated data is read directly from the tarball.
+
+    If the content of users.scim and groups.scim equals the last successfully imported one
+    (and the settings did not change), the import is skipped unless the last import is older
+    than full_sync_max_age seconds (0 disables skipping).
+
+    The KeyStone and Endpoint instances are kept for subsequent calls with the same configuration,
+    their user and project maps are reused for map_ttl seconds.
+
+    :return: the applied plan or None if the import was skipped
     """
     if ssh_key_blocklist is None:
         ssh_key_blocklist = []
-    d = datetime.today()
-    dir = f"{base_dir}/{d.year}_{d.month}_{d.day}_{d.hour}:{d.minute}:{d.second}.{d.microsecond}"
-    os.mkdir(dir)
 
     report.info("Processing data uploaded by Perun: %s" % tarball_path)
 
-    # extract tar file
-    tar = tarfile.open(tarball_path, "r:gz")
-    tar.extractall(path=dir)
-    tar.close()
-
-    # import into keystone
-    keystone = KeyStone(default_role=default_role,
-                        create_default_role=True,
-                        target_domain_name=target_domain_name,
-                        read_only=read_only,
-                        nested=nested,
-                        environ=local_environment)
-    endpoint = Endpoint(keystone=keystone,
-                        mode="denbi_portal_compute_center",
-                        support_elixir_name=support_elixir_name,
-                        support_quotas=support_quotas,
-                        support_router=support_router,
-                        external_network_id=external_network_id,
-                        support_network=support_network,
-                        support_default_ssh_sgrule=support_default_ssh_sgrule,
-                        ssh_key_blocklist=ssh_key_blocklist
-                        )
-    endpoint.import_data(dir + '/users.scim', dir + '/groups.scim')
-    report.info("Finished processing %s" % tarball_path)
-
-    # Cleanup
-    if cleanup:
-        shutil.rmtree(dir)
+    with PerunTarball(tarball_path) as tarball:
+        digest = tarball.digest()
+
+        # skip import if the same data was already imported with the same settings
+        state_path = f"{base_dir}/last_import.json"
+        context = json.dumps([target_domain_name, default_role, nested, support_elixir_name, support_quotas,
+                              support_router, external_network_id, support_network, support_default_ssh_sgrule,
+                              sorted(ssh_key_blocklist), group_membership])
+        state = last_import(state_path)
+        if state.get('digest', None) == digest and state.get('context', None) == context \
+                and time.time() - state.get('time', 0) < full_sync_max_age:
+            report.info("Skipped processing %s, data unchanged since %s (digest %s)",
+                        tarball.path, datetime.fromtimestamp(state['time']).isoformat(), digest)
+            return None
+
+        # import into keystone
+        endpoint = get_endpoint(dict(default_role=default_role,
+                                     create_default_role=True,
+                                     target_domain_name=target_domain_name,
+                                     read_only=read_only,
+                                     nested=nested,
+                                     role_assignment_sweep=role_assignment_sweep,
+                                     group_membership=group_membership,
+                                     use_tags=use_tags,
+                                     pool_size=workers),
+                                dict(mode="denbi_portal_compute_center",
+                                     support_elixir_name=support_elixir_name,
+                                     support_quotas=support_quotas,
+                                     support_router=support_router,
+                                     external_network_id=external_network_id,
+                                     support_network=support_network,
+                                     support_default_ssh_sgrule=support_default_ssh_sgrule,
+                                     ssh_key_blocklist=ssh_key_blocklist,
+                                     workers=workers,
+                                     map_ttl=map_ttl),
+                                fingerprint_file=f"{base_dir}/fingerprints.json" if fingerprints else None,
+                                full_reconcile_interval=full_reconcile_interval)
+        if not read_only:
+            # keystone no longer matches the last import once this import starts changing it,
+            # the state is stored again only if this import is applied completely
+            clear_last_import(state_path)
+        try:
+            plan = endpoint.import_data(tarball.open('users.scim'), tarball.open('groups.scim'))
+        except Exception:
+            # start over with new instances next time
+            invalidate_endpoints()
+            raise
+        if not read_only and plan.complete:
+            store_last_import(state_path, digest, context)
+        elif not read_only:
+            # an identical upload must not be skipped, the missing changes are retried with it
+            report.warning("Import of %s incomplete for projects %s" % (tarball.path, sorted(plan.incomplete)))
+        report.info("Finished processing %s" % tarball.path)
+        return plan
+
+
+class UploadTooLarge(Exception):
+    """
+    Raised if an upload exceeds the maximum upload size.
+    """
+    pass
 
 
-@app.route("/upload", methods=['PUT'])
-def upload():
-    """Receive a perun tarball, store it in a temporary file and process it."""
+def store_upload(stream, max_size, chunk_size=65536):
+    """
+    Write an uploaded tarball chunk by chunk into a temporary file.
 
+    :param stream: file like object providing the uploaded data
+    :param max_size: maximum size of the upload in bytes
+    :param chunk_size: number of bytes read at once
+    :return: tuple of path, size and digest (sha256) of the stored upload
+    :raise UploadTooLarge: if the upload exceeds max_size, the temporary file is removed then
+    """
     # Create a tempfile to write the data to. delete=False because we will
     # close after writing, before processing, and this would normally cause a
     # tempfile to disappear.
-    file = tempfile.NamedTemporaryFile(prefix='perun_upload', suffix='.tar.gz', delete=False)
+    size = 0
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(prefix='perun_upload', suffix='.tar.gz', delete=False) as file:
+        try:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(f"Upload exceeds maximum size of {max_size} bytes.")
+                digest.update(chunk)
+                file.write(chunk)
+        except BaseException:
+            file.close()
+            os.unlink(file.name)
+            raise
+    return file.name, size, digest.hexdigest()
+
+
+def archive_upload(tarball_path, base_dir):
+    """
+    Move an uploaded tarball to base_dir, named by the current time.
 
-    # store uploaded data
-    file.write(request.get_data())
-    file.close()
-
-    # execute task
-    result = executor.submit(process_tarball,
-                             file.name,
-                             base_dir=app.config.get('BASE_DIR'),
-                             read_only=strtobool(app.config.get('KEYSTONE_READ_ONLY', "False")),
-                             cleanup=strtobool(app.config.get('CLEANUP', "False")),
-                             target_domain_name=app.config.get('TARGET_DOMAIN_NAME'),
-                             default_role=app.config.get('DEFAULT_ROLE'),
-                             nested=strtobool(app.config.get('NESTED', "False")),
-                             support_elixir_name=strtobool(app.config.get('ELIXIR_NAME', "False")),
-                             support_quotas=strtobool(app.config.get('SUPPORT_QUOTAS', "False")),
-                             support_router=strtobool(app.config.get('SUPPORT_ROUTER', "False")),
-                             external_network_id=app.config.get('EXTERNAL_NETWORK_ID'),
-                             support_network=strtobool(app.config.get('SUPPORT_NETWORK', "False")),
-                             support_default_ssh_sgrule=strtobool(app.config.get('SUPPORT_DEFAULT_SSH_SGRULE', "False")),
-                             ssh_key_blocklist=app.config.get('SSH_KEY_BLOCKLIST', None)
-                             )
-
-    # if task fails with an exception, the thread pool catches the exception,
-    # stores it, then re-raises it when we call the result() function.
+    :return: path of the archived tarball
+    """
+    d = datetime.today()
+    archive = f"{base_dir}/{d.year}_{d.month}_{d.day}_{d.hour}:{d.minute}:{d.second}.{d.microsecond}.tar.gz"
+    shutil.move(tarball_path, archive)
+    return archive
+
+
+def process_upload(tarball_path, base_dir, cleanup=False, **kwargs):
+    """
+    Process an uploaded tarball (see process_tarball). The tarball is removed afterwards if cleanup is set,
+    otherwise it is kept in base_dir.
+    """
+    if not cleanup:
+        tarball_path = archive_upload(tarball_path, base_dir)
     try:
-        result.result()
-    except Exception:
-        traceback.print_exc()
+        return process_tarball(tarball_path, base_dir=base_dir, **kwargs)
+    finally:
+        if cleanup:
+            os.unlink(tarball_path)
+
+
+def discard_upload(tarball_path, base_dir, cleanup=False, **kwargs):
+    """
+    Discard an uploaded tarball superseded by a newer upload. Like processed uploads, the tarball
+    is removed if cleanup is set, otherwise it is kept in base_dir.
+    """
+    if cleanup:
+        report.info(f"Discarding superseded upload {tarball_path}")
+        os.unlink(tarball_path)
+    else:
+        report.info(f"Discarding superseded upload {tarball_path}, kept as {archive_upload(tarball_path, base_dir)}")
 
-    if app.config.get('CLEANUP', False):
-        os.unlink(file)
 
-    return ""
+# Create job queue, jobs are processed one after another
+jobs = JobQueue(process_upload,
+                max_queued=int(app.config.get('MAX_QUEUED_JOBS')),
+                coalesce=strtobool(app.config.get('COALESCE')),
+                discard=discard_upload)
+
+
+@app.route("/upload", methods=['PUT'])
+def upload():
+    """Receive a perun tarball, store it in a temporary file and queue it for processing."""
+
+    # store uploaded data
+    max_size = int(app.config.get('MAX_UPLOAD_SIZE'))
+    if request.content_length is not None and request.content_length > max_size:
+        return jsonify(error=f"Upload exceeds maximum size of {max_size} bytes."), 413
+    try:
+        path, size, digest = store_upload(request.stream, max_size)
+    except UploadTooLarge as e:
+        report.warning(f"Rejected upload: {e}")
+        return jsonify(error=str(e)), 413
+
+    # queue task
+    try:
+        job = jobs.submit(path,
+                          details={'size': size, 'sha256': digest},
+                          base_dir=app.config.get('BASE_DIR'),
+                          read_only=strtobool(app.config.get('KEYSTONE_READ_ONLY', "False")),
+                          cleanup=strtobool(app.config.get('CLEANUP', "False")),
+                          target_domain_name=app.config.get('TARGET_DOMAIN_NAME'),
+                          default_role=app.config.get('DEFAULT_ROLE'),
+                          nested=strtobool(app.config.get('NESTED', "False")),
+                          support_elixir_name=strtobool(app.config.get('ELIXIR_NAME', "False")),
+                          support_quotas=strtobool(app.config.get('SUPPORT_QUOTAS', "False")),
+                          support_router=strtobool(app.config.get('SUPPORT_ROUTER', "False")),
+                          external_network_id=app.config.get('EXTERNAL_NETWORK_ID'),
+                          support_network=strtobool(app.config.get('SUPPORT_NETWORK', "False")),
+                          support_default_ssh_sgrule=strtobool(app.config.get('SUPPORT_DEFAULT_SSH_SGRULE', "False")),
+                          ssh_key_blocklist=app.config.get('SSH_KEY_BLOCKLIST', None),
+                          role_assignment_sweep=strtobool(app.config.get('ROLE_ASSIGNMENT_SWEEP', "False")),
+                          group_membership=strtobool(app.config.get('GROUP_MEMBERSHIP', "False")),
+                          use_tags=strtobool(app.config.get('USE_TAGS', "False")),
+                          workers=int(app.config.get('WORKERS')),
+                          fingerprints=strtobool(app.config.get('FINGERPRINTS', "False")),
+                          full_reconcile_interval=int(app.config.get('FULL_RECONCILE_INTERVAL')),
+                          full_sync_max_age=int(app.config.get('FULL_SYNC_MAX_AGE')),
+                          map_ttl=int(app.config.get('MAP_TTL'))
+                          )
+    except QueueFull as e:
+        os.unlink(path)
+        report.warning(f"Rejected upload: {e}")
+        return jsonify(error=str(e)), 429
+
+    report.info(f"Queued upload {path} ({size} bytes, sha256 {digest}) as job {job.id}")
+    return jsonify(job.to_dict()), 202, {'Location': f"/jobs/{job.id}"}
+
+
+@app.route("/invalidate", methods=['POST'])
+def invalidate():
+    """Drop the kept keystone connections and maps, the next import starts from scratch."""
+    invalidate_endpoints()
+    report.info("Invalidated keystone connections and maps.")
+    return "", 204
+
+
+@app.route("/jobs", methods=['GET'])
+def list_jobs():
+    """Return the state of all remembered jobs, oldest first."""
+    return jsonify([job.to_dict() for job in jobs.jobs()])
+
+
+@app.route("/jobs/<job_id>", methods=['GET'])
+def get_job(job_id):
+    """Return the state of the given job."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify(error=f"Unknown job {job_id}"), 404
+    return jsonify(job.to_dict())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Export the quotas and usage of all perun managed projects."""
+
+import argparse
+import logging
+import sys
+
+from denbi.perun.keystone import KeyStone
+from denbi.perun.quotas.snapshot import FORMATS, SnapshotProgress, export_snapshot
+
+
+logging.basicConfig(level=logging.WARN)
+
+
+def main():
+    """Main method."""
+    parser = argparse.ArgumentParser(description='Export quotas and usage of all perun managed projects')
+    parser.add_argument('--domain', default='elixir',
+                        help="Domain of the perun managed projects, defaults to 'elixir'")
+    parser.add_argument('--role', default='user',
+                        help="Default role of the propagation, must exist, defaults to 'user'")
+    parser.add_argument('--flag', default='perun_propagation',
+                        help="Flag marking perun managed projects, defaults to 'perun_propagation'")
+    parser.add_argument('--use-tags', action='store_true', default=False,
+                        help="list only projects tagged with the flag")
+    parser.add_argument('--format', choices=FORMATS, default='jsonl',
+                        help="output format, defaults to 'jsonl'")
+    parser.add_argument('--output', metavar='FILE',
+                        help="append the snapshot to FILE instead of writing it to stdout")
+    parser.add_argument('--progress', metavar='FILE',
+                        help="keep the ids of exported projects in FILE and skip them, allows resuming an "
+                             "interrupted export (requires --output)")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="number of concurrent requests per service, defaults to 4")
+    parser.add_argument("-v", "--verbose", dest="verbose_count",
+                        action="count", default=0, help="increases log verbosity for each occurrence.")
+    args = parser.parse_args()
+
+    # Defaults to WARN, with every added -v it goes to INFO then DEBUG
+    log_level = max(3 - args.verbose_count, 1) * 10
+    logging.getLogger('denbi').setLevel(log_level)
+
+    if args.progress and not args.output:
+        print("An output file is mandatory if progress is set.")
+        exit(1)
+
+    keystone = KeyStone(default_role=args.role, flag=args.flag, target_domain_name=args.domain, read_only=True,
+                        workers=args.workers, use_tags=args.use_tags, migrate_tags=False, quota_cache_ttl=0)
+    # members are not needed, do not load them
+    projects = keystone.projects_map(members_for=()).values()
+
+    progress = SnapshotProgress(args.progress) if args.progress else None
+    output = open(args.output, 'a', newline='') if args.output else sys.stdout
+    try:
+        exported, failed = export_snapshot(keystone.quota_factory, projects, output, output_format=args.format,
+                                           progress=progress, write_header=output.tell() == 0 if args.output else True,
+                                           workers=args.workers)
+    finally:
+        if args.output:
+            output.close()
+        if progress is not None:
+            progress.close()
+
+    logging.getLogger('denbi').info("Exported quotas of %d projects, %d failed.", exported, failed)
+    if failed:
+        exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,12 +21,16 @@ def main():
     parser = argparse.ArgumentParser(description='Set project flag')
     parser.add_argument('project_id')
     parser.add_argument('flag')
+    parser.add_argument('--tag', action='store_true', default=False,
+                        help="also tag the project with the flag (needed if projects are filtered by tag)")
     args = parser.parse_args()
 
     keystone = scripts.obtain_keystone()
 
     # Update the project
     keystone.projects.update(args.project_id, flag=args.flag)
+    if args.tag:
+        keystone.projects.add_tag(args.project_id, args.flag)
 
 
 if __name__ == '__main__':
@@ -25,7 +25,8 @@ def main():
 
     keystone = scripts.obtain_keystone()
 
-    # Update the user
+    # Update the user, keystone does not support user tags, users are always
+    # identified by the flag attribute
     # TODO(hxr): support setting perun_id as well
     keystone.users.update(args.user_id, flag=args.flag)
 
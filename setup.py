@@ -31,6 +31,7 @@ setup(
         perun_propagation_service=denbi.scripts.perun_propagation_service:main
         perun_set_project_flag=denbi.scripts.set_project_flag:main
         perun_set_user_flag=denbi.scripts.set_user_flag:main
+        perun_quota_snapshot=denbi.scripts.quota_snapshot:main
     ''',
     classifiers=[
         'Environment :: OpenStack'
@@ -0,0 +1,201 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+import unittest
+
+from denbi.perun.endpoint import Endpoint
+from denbi.perun.plan import Grant, NetworkProvision, Plan, ProjectCreate, ProjectDelete, ProjectUpdate, \
+    QuotaUpdate, Revoke, UserCreate, UserDelete, UserUpdate
+
+# order of the groups applied by Endpoint.apply_plan
+ORDER = ('user', 'project', 'membership', 'prefetch', 'quota', 'network')
+
+
+class QuotaBatch:
+    def __init__(self, manager):
+        self.manager = manager
+        self.staged = {}
+
+    def stage(self, name, value):
+        self.staged[name] = value
+
+    def commit(self):
+        self.manager.keystone.call('quota', self.manager.project_id)
+        self.manager.quotas.update(self.staged)
+
+
+class QuotaManager:
+    """Quota manager of a project, all quotas are in use up to 2."""
+
+    def __init__(self, keystone, project_id):
+        self.keystone = keystone
+        self.project_id = project_id
+        self.quotas = {}
+
+    def get_current_quota(self, name):
+        return self.quotas.get(name, 0)
+
+    def check_value(self, name, value):
+        return value >= 2
+
+    def batch(self):
+        return QuotaBatch(self)
+
+
+class QuotaFactory:
+    def __init__(self, keystone):
+        self.keystone = keystone
+
+    def prefetch(self, project_ids):
+        self.keystone.call('prefetch', *project_ids)
+
+    def get_manager(self, project_id):
+        return QuotaManager(self.keystone, project_id)
+
+
+class FakeKeyStone:
+    """
+    KeyStone recording the changes applied to it (and the threads applying them).
+
+    Changes sleep for the given delay, so concurrently applied changes overlap. Changes of the
+    perun ids in failing sleep for the given time and raise a ValueError afterwards.
+    """
+
+    def __init__(self, delay=0.01, failing=None):
+        self.delay = delay
+        self.failing = failing or {}
+        self.calls = []
+        self.threads = set()
+        self.lock = threading.Lock()
+        self._neutron = None
+        self.quota_factory = QuotaFactory(self)
+        self.denbi_project_map = {}
+
+    def call(self, group, *args):
+        with self.lock:
+            self.calls.append((group,) + args)
+            self.threads.add(threading.current_thread())
+
+    def change(self, group, perun_id):
+        time.sleep(self.failing.get(perun_id, self.delay))
+        self.call(group, perun_id)
+        if perun_id in self.failing:
+            raise ValueError(f"change of {perun_id} failed")
+
+    def users_create(self, elixir_id, perun_id, **kwargs):
+        self.change('user', perun_id)
+
+    def users_update(self, perun_id, **kwargs):
+        self.change('user', perun_id)
+
+    def users_delete(self, perun_id):
+        self.change('user', perun_id)
+
+    def projects_create(self, perun_id, **kwargs):
+        self.change('project', perun_id)
+        self.denbi_project_map[perun_id] = {'id': 'os-' + perun_id, 'perun_id': perun_id, 'name': perun_id}
+
+    def projects_update(self, perun_id, **kwargs):
+        self.change('project', perun_id)
+
+    def projects_delete(self, perun_id):
+        self.change('project', perun_id)
+
+    def projects_append_user(self, project_id, user_id):
+        self.change('membership', project_id)
+
+    def projects_remove_user(self, project_id, user_id):
+        self.change('membership', project_id)
+
+    def projects_store_quotas(self, perun_id, quotas):
+        self.denbi_project_map[perun_id]['denbi_quotas'] = quotas
+
+
+class Routers:
+    def __init__(self, keystone):
+        self.keystone = keystone
+
+    def __call__(self, project, router_only=False):
+        self.keystone.call('network', project['perun_id'])
+
+
+def create_plan():
+    plan = Plan()
+    plan.network_provisions.append(NetworkProvision('10', True, False))
+    plan.quota_updates.extend([QuotaUpdate('10', {'denbiCoresLimit': 4}),
+                               QuotaUpdate('11', {'denbiCoresLimit': 1})])
+    plan.grants.extend([Grant('10', '1'), Grant('11', '2')])
+    plan.revokes.append(Revoke('12', '3'))
+    plan.project_creates.extend([ProjectCreate('10', 'ten', None), ProjectCreate('11', 'eleven', None)])
+    plan.project_updates.append(ProjectUpdate('12', 'twelve', None, True))
+    plan.project_deletes.append(ProjectDelete('13'))
+    plan.user_creates.extend([UserCreate('1', 'one', None, None, None, True),
+                              UserCreate('2', 'two', None, None, None, True)])
+    plan.user_updates.append(UserUpdate('3', 'three', None, None, None, True))
+    plan.user_deletes.append(UserDelete('4'))
+    return plan
+
+
+class TestApplyPlan(unittest.TestCase):
+    """Unit test for applying a plan with Endpoint.apply_plan.
+
+    A fake KeyStone records the applied changes, no Openstack setup is needed.
+    """
+
+    def create_endpoint(self, keystone, workers):
+        endpoint = Endpoint(keystone=keystone, workers=workers)
+        endpoint._create_router = Routers(keystone)
+        return endpoint
+
+    def test_group_order(self):
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                keystone = FakeKeyStone()
+                plan = create_plan()
+                self.create_endpoint(keystone, workers).apply_plan(plan)
+
+                groups = [ORDER.index(call[0]) for call in keystone.calls]
+                self.assertListEqual(groups, sorted(groups))
+                self.assertIn(('prefetch', 'os-10', 'os-11'), keystone.calls)
+                # quotas below the used resources are not set, all other changes are applied once
+                # (plus the prefetch instead of the quotas of 11)
+                self.assertEqual(len(keystone.calls), len(plan))
+                self.assertIn(('quota', 'os-10'), keystone.calls)
+                self.assertNotIn(('quota', 'os-11'), keystone.calls)
+                self.assertSetEqual(plan.incomplete, {'11'})
+                self.assertDictEqual(keystone.denbi_project_map['10']['denbi_quotas'], {'denbiCoresLimit': 4})
+
+    def test_first_error(self):
+        # the first failing change finishes last, its error is raised nevertheless
+        keystone = FakeKeyStone(failing={'1': 0.1, '3': 0.01})
+        with self.assertRaises(ValueError) as context:
+            self.create_endpoint(keystone, 4).apply_plan(create_plan())
+        self.assertEqual(str(context.exception), "change of 1 failed")
+        # all changes of the failing group are applied, later groups are not started
+        self.assertListEqual(sorted(call[1] for call in keystone.calls), ['1', '2', '3', '4'])
+
+    def test_serial(self):
+        keystone = FakeKeyStone()
+        self.create_endpoint(keystone, 1).apply_plan(create_plan())
+        self.assertSetEqual(keystone.threads, {threading.current_thread()})
+        # changes are applied in the order of the plan
+        self.assertListEqual([call[1] for call in keystone.calls if call[0] == 'user'], ['1', '2', '3', '4'])
+
+        keystone = FakeKeyStone()
+        self.create_endpoint(keystone, 4).apply_plan(create_plan())
+        self.assertTrue(keystone.threads - {threading.current_thread()})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tempfile
+import unittest
+
+from denbi.perun.fingerprint import FingerprintStore, fingerprint
+
+
+class TestFingerprintStore(unittest.TestCase):
+    """Unit test for class FingerprintStore.
+
+    The store does not need any Openstack setup.
+    """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'fingerprints.json')
+        self.project = {'perun_id': '10', 'name': 'ten', 'members': ['2', '1']}
+
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint(self.project), fingerprint(dict(self.project, members=['1', '2'])))
+        self.assertNotEqual(fingerprint(self.project), fingerprint(dict(self.project, name='eleven')))
+
+    def test_store(self):
+        store = FingerprintStore(self.path, full_reconcile_interval=3600)
+        store.load('context')
+        self.assertTrue(store.full_reconcile_due())
+        self.assertFalse(store.unchanged('projects', self.project))
+
+        store.update('projects', {'10': [fingerprint(self.project), 'os-10']}, full_reconcile=True)
+        store.save()
+
+        store = FingerprintStore(self.path, full_reconcile_interval=3600)
+        store.load('context')
+        self.assertFalse(store.full_reconcile_due())
+        self.assertTrue(store.unchanged('projects', self.project))
+        self.assertEqual(store.keystone_id('projects', '10'), 'os-10')
+        self.assertFalse(store.unchanged('projects', dict(self.project, members=['1'])))
+
+        # changed settings discard all fingerprints
+        store.load('other context')
+        self.assertTrue(store.full_reconcile_due())
+        self.assertFalse(store.unchanged('projects', self.project))
+
+
+if __name__ == '__main__':
+    unittest.main()
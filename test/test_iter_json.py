@@ -0,0 +1,47 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import io
+import json
+import unittest
+
+from denbi.perun.endpoint import iter_json
+
+DOCUMENTS = ['[]',
+             ' [ ] ',
+             '[-1500.0]',
+             '[1.5, 2]',
+             '[1e10, -2.5E-3, 0, 10, 123456789]',
+             '[true, false, null, "a", "", "\\"quoted\\" ]"]',
+             '\n[\n  {"id": 1, "name": "a,b]", "values": [1.25, {"x": null}]},\n  {"id": 2}\n]\n',
+             '[[1, [2.0]], {}, [], "\\u00e4"]']
+
+
+class TestIterJson(unittest.TestCase):
+    """Unit test for the streaming json array parser iter_json."""
+
+    def test_chunk_sizes(self):
+        for doc in DOCUMENTS:
+            for chunk_size in range(1, len(doc) + 1):
+                with self.subTest(doc=doc, chunk_size=chunk_size):
+                    self.assertListEqual(list(iter_json(io.StringIO(doc), chunk_size)), json.loads(doc))
+
+    def test_invalid(self):
+        for doc in ('{}', '[1, 2', '[1.5.5]', '[1x]', '["a"', '[1 2]', '[,1]', '[1,]', '[1,,2]'):
+            for chunk_size in range(1, len(doc) + 1):
+                with self.subTest(doc=doc, chunk_size=chunk_size):
+                    with self.assertRaises(ValueError):
+                        list(iter_json(io.StringIO(doc), chunk_size))
+
+
+if __name__ == '__main__':
+    unittest.main()
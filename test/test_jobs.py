@@ -0,0 +1,85 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import unittest
+
+from denbi.perun.jobs import JobQueue, QueueFull
+from denbi.perun.plan import Plan
+
+
+class TestJobQueue(unittest.TestCase):
+    """Unit test for class JobQueue.
+
+    The job queue does not need any Openstack setup.
+    """
+
+    def setUp(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def process(self, value):
+        self.started.set()
+        self.release.wait()
+        if value == 'fail':
+            raise ValueError('failed')
+        return Plan() if value == 'plan' else None
+
+    def test_states(self):
+        jobs = JobQueue(self.process, max_queued=3)
+        plan_job = jobs.submit('plan')
+        skipped_job = jobs.submit('skip')
+        failed_job = jobs.submit('fail')
+        self.release.set()
+        jobs.join()
+
+        self.assertEqual(plan_job.state, 'finished')
+        self.assertEqual(plan_job.counts, Plan().counts())
+        self.assertEqual(skipped_job.state, 'skipped')
+        self.assertEqual(failed_job.state, 'failed')
+        self.assertEqual(failed_job.error, 'failed')
+        self.assertListEqual(jobs.jobs(), [plan_job, skipped_job, failed_job])
+        self.assertIs(jobs.get(plan_job.id), plan_job)
+        self.assertIsNone(jobs.get('unknown'))
+
+    def test_queue_full(self):
+        jobs = JobQueue(self.process, max_queued=1)
+        jobs.submit('plan')
+        self.started.wait()
+        # the first job is running, the second one is waiting
+        jobs.submit('plan')
+        with self.assertRaises(QueueFull):
+            jobs.submit('plan')
+        self.release.set()
+        jobs.join()
+
+    def test_coalesce(self):
+        discarded = []
+        jobs = JobQueue(self.process, max_queued=1, coalesce=True, discard=discarded.append)
+        running_job = jobs.submit('plan')
+        self.started.wait()
+        superseded_jobs = [jobs.submit('first'), jobs.submit('second')]
+        latest_job = jobs.submit('plan')
+        self.release.set()
+        jobs.join()
+
+        self.assertEqual(running_job.state, 'finished')
+        self.assertListEqual([job.state for job in superseded_jobs], ['superseded', 'superseded'])
+        self.assertEqual(superseded_jobs[0].superseded_by, superseded_jobs[1].id)
+        self.assertEqual(superseded_jobs[1].superseded_by, latest_job.id)
+        self.assertListEqual(latest_job.supersedes, [superseded_jobs[1].id])
+        self.assertListEqual(discarded, ['first', 'second'])
+        self.assertEqual(latest_job.state, 'finished')
+
+
+if __name__ == '__main__':
+    unittest.main()
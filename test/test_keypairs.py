@@ -0,0 +1,111 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import unittest
+
+from collections import namedtuple
+
+from denbi.perun.keypairs import KeypairIndex
+
+Keypair = namedtuple('Keypair', ['name', 'public_key'])
+
+
+class NovaKeypairs:
+    """Keypairs of nova, listed per user sorted by name and paginated by marker and limit."""
+
+    def __init__(self, keypairs):
+        self.keypairs = keypairs
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def list(self, user_id, marker=None, limit=None):
+        with self.lock:
+            self.requests.append((user_id, marker))
+        keypairs = sorted(self.keypairs.get(user_id, []))
+        if marker is not None:
+            keypairs = [keypair for keypair in keypairs if keypair.name > marker]
+        return keypairs[:limit]
+
+
+class NovaClient:
+    def __init__(self, keypairs):
+        self.keypairs = NovaKeypairs(keypairs)
+
+
+class TestKeypairIndex(unittest.TestCase):
+    """Unit test for class KeypairIndex.
+
+    A stub nova client serves the keypairs, no Openstack setup is needed.
+    """
+
+    def setUp(self):
+        # the propagated keypair of 1 is on the second page, 3 has no propagated keypair
+        self.nova = NovaClient({'1': [Keypair('a', 'key a'), Keypair('b', 'key b'),
+                                      Keypair(KeypairIndex.KEYPAIR_NAME, 'key 1')],
+                                '2': [Keypair(KeypairIndex.KEYPAIR_NAME, 'key 2')],
+                                '3': [Keypair('a', 'key a')]})
+        self.index = KeypairIndex(self.nova, workers=2, page_size=2)
+
+    def test_load(self):
+        self.index.load(['1', '2', '3'])
+        requests = len(self.nova.keypairs.requests)
+        self.assertEqual(self.index.get('1'), 'key 1')
+        self.assertEqual(self.index.get('2'), 'key 2')
+        self.assertIsNone(self.index.get('3'))
+        # lookups of loaded users are served from memory
+        self.assertEqual(len(self.nova.keypairs.requests), requests)
+
+    def test_get(self):
+        self.assertEqual(self.index.get('2'), 'key 2')
+        self.assertListEqual(self.nova.keypairs.requests, [('2', None)])
+        self.assertEqual(self.index.get('2'), 'key 2')
+        self.assertIsNone(self.index.get('4'))
+        self.assertListEqual(self.nova.keypairs.requests, [('2', None), ('4', None)])
+
+    def test_set_clear(self):
+        self.index.load(['1', '3'])
+        self.index.set('1', None)
+        self.index.set('3', 'key 3')
+        self.assertIsNone(self.index.get('1'))
+        self.assertEqual(self.index.get('3'), 'key 3')
+        requests = len(self.nova.keypairs.requests)
+
+        self.index.clear()
+        self.assertEqual(self.index.get('1'), 'key 1')
+        self.assertGreater(len(self.nova.keypairs.requests), requests)
+
+    def test_pagination(self):
+        # the second page of 1 is shorter than the page size and ends the listing
+        self.assertEqual(self.index._fetch('1'), 'key 1')
+        self.assertListEqual(self.nova.keypairs.requests, [('1', None), ('1', 'b')])
+
+        # the listing stops at the propagated keypair
+        self.nova.keypairs.keypairs['1'].append(Keypair('z', 'key z'))
+        self.nova.keypairs.requests.clear()
+        self.assertEqual(self.index._fetch('1'), 'key 1')
+        self.assertListEqual(self.nova.keypairs.requests, [('1', None), ('1', 'b')])
+
+        # a full last page is followed by an empty one
+        self.nova.keypairs.keypairs['3'].append(Keypair('b', 'key b'))
+        self.nova.keypairs.requests.clear()
+        self.assertIsNone(self.index._fetch('3'))
+        self.assertListEqual(self.nova.keypairs.requests, [('3', None), ('3', 'b')])
+
+        # the listing stops at a server ignoring the marker
+        self.nova.keypairs.list = lambda user_id, marker=None, limit=None: [Keypair('a', 'key a'),
+                                                                            Keypair('b', 'key b')]
+        self.assertIsNone(self.index._fetch('1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -279,13 +279,13 @@ class TestKeystone(unittest.TestCase):
         self.assertEqual(projects[project_a['perun_id']], project_a)
         self.assertEqual(projects[project_b['perun_id']], project_b)
 
-        list = project_a['members']
+        list = [*project_a['members']]
         expected_list = [user_a['perun_id'], user_b['perun_id']]
         self.assertListEqual(list, expected_list,
                              "Memberlist project_a contains [" + (", ".join(list)) + "] but expected [" + (
                                  ", ".join(expected_list)) + "]")
 
-        list = project_b['members']
+        list = [*project_b['members']]
         expected_list = [user_a['perun_id'], user_b['perun_id'], user_c['perun_id']]
 
         self.assertListEqual(list, expected_list,
@@ -350,6 +350,74 @@ class TestKeystone(unittest.TestCase):
                          "Termination of projects failed ... count " + str(
                              len(project_map.keys())) + " but expect " + str(count_projects) + "!")
 
+    def test_projects_map_role_assignment_sweep(self):
+        """Test that loading memberships with a single role assignment listing
+        results in the same members as loading them per project.
+
+        :return:
+        """
+        print("Run 'test_projects_map_role_assignment_sweep'")
+
+        project = self.ks.projects_create(self.__uuid())
+        id = self.__uuid()
+        user_a = self.ks.users_create(id, id + "@elixir-europe.org")
+        id = self.__uuid()
+        user_b = self.ks.users_create(id, id + "@elixir-europe.org")
+        self.ks.projects_append_user(project['perun_id'], user_a['perun_id'])
+        self.ks.projects_append_user(project['perun_id'], user_b['perun_id'])
+
+        self.ks.users_map()
+        self.ks.role_assignment_sweep = False
+        members = self.ks.projects_map()[project['perun_id']]['members']
+        self.ks.role_assignment_sweep = True
+        swept_members = self.ks.projects_map()[project['perun_id']]['members']
+
+        self.assertSetEqual(set(members), {user_a['perun_id'], user_b['perun_id']})
+        self.assertSetEqual(set(swept_members), set(members))
+
+        # cleanup
+        for user in (user_a, user_b):
+            self.ks.users_delete(user['perun_id'])
+            self.ks.users_terminate(user['perun_id'])
+        self.ks.projects_delete(project['perun_id'])
+        self.ks.projects_terminate(project['perun_id'])
+
+    def test_projects_group_membership_migration(self):
+        """Test that per user role assignments are migrated to the project group
+        and that memberships are managed by group afterwards.
+
+        :return:
+        """
+        print("Run 'test_projects_group_membership_migration'")
+
+        project = self.ks.projects_create(self.__uuid())
+        id = self.__uuid()
+        user_a = self.ks.users_create(id, id + "@elixir-europe.org")
+        id = self.__uuid()
+        user_b = self.ks.users_create(id, id + "@elixir-europe.org")
+        self.ks.projects_append_user(project['perun_id'], user_a['perun_id'])
+
+        # switch to group based memberships, loading the map migrates the project
+        self.ks.group_membership = True
+        self.ks.users_map()
+        denbi_project = self.ks.projects_map()[project['perun_id']]
+        self.assertListEqual(list(denbi_project['members']), [user_a['perun_id']])
+        direct = [role for role in self.ks.keystone.role_assignments.list(project=project['id'])
+                  if hasattr(role, 'user')]
+        self.assertListEqual(direct, [])
+
+        self.ks.projects_append_user(project['perun_id'], user_b['perun_id'])
+        self.ks.projects_remove_user(project['perun_id'], user_a['perun_id'])
+        self.ks.users_map()
+        self.assertListEqual(list(self.ks.projects_map()[project['perun_id']]['members']), [user_b['perun_id']])
+
+        # cleanup
+        for user in (user_a, user_b):
+            self.ks.users_delete(user['perun_id'])
+            self.ks.users_terminate(user['perun_id'])
+        self.ks.projects_delete(project['perun_id'])
+        self.ks.projects_terminate(project['perun_id'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,54 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from denbi.perun.membership import MembershipIndex
+
+
+class TestMembershipIndex(unittest.TestCase):
+    """Unit test for class MembershipIndex."""
+
+    def setUp(self):
+        self.index = MembershipIndex()
+        self.members_a = self.index.set_members('a', ['2', '1'])
+        self.members_b = self.index.set_members('b', ['1'])
+
+    def test_members(self):
+        self.assertListEqual(list(self.members_a), ['2', '1'])
+        self.assertIn('1', self.members_a)
+        self.assertSetEqual(self.members_a - {'1', '3'}, {'2'})
+        self.assertSetEqual({'1', '3'} - self.members_a, {'3'})
+
+        # views are live
+        self.index.add('a', '3')
+        self.index.remove('a', '2')
+        self.assertListEqual(list(self.members_a), ['1', '3'])
+        with self.assertRaises(ValueError):
+            self.index.remove('a', '2')
+
+    def test_projects(self):
+        self.assertSetEqual(self.index.projects('1'), {'a', 'b'})
+        self.index.remove('b', '1')
+        self.assertSetEqual(self.index.projects('1'), {'a'})
+
+        self.index.drop_user('1')
+        self.assertSetEqual(self.index.projects('1'), set())
+        self.assertListEqual(list(self.members_a), ['2'])
+
+        self.index.drop_project('a')
+        self.assertSetEqual(self.index.projects('2'), set())
+        self.assertEqual(len(self.members_a), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
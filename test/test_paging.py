@@ -0,0 +1,109 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import types
+import unittest
+
+from denbi.perun.paging import IncompleteListing, KeystoneListing, Page, iter_pages
+
+
+class Listing:
+    """Listing of 25 items, supporting marker and/or limit like a keystone manager."""
+
+    def __init__(self, marker=True, limit=True, list_limit=None):
+        self.items = [types.SimpleNamespace(id=f"{i:03d}") for i in range(25)]
+        self.marker = marker
+        self.limit = limit
+        # server side limit, truncated pages are flagged like keystone does
+        self.list_limit = list_limit
+        self.calls = 0
+
+    def list(self, marker=None, limit=None, **kwargs):
+        self.calls += 1
+        items = self.items
+        if self.marker and marker is not None:
+            items = [item for item in items if item.id > marker]
+        if self.limit:
+            items = items[:limit]
+        if self.list_limit is not None:
+            return Page(items[:self.list_limit], truncated=len(items) > self.list_limit)
+        return items
+
+
+class Manager:
+    """keystoneclient like manager of a collection of users."""
+
+    collection_key = 'users'
+
+    def __init__(self, body):
+        self.client = self
+        self.body = body
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        return None, self.body
+
+    @staticmethod
+    def resource_class(manager, info, loaded=False):
+        return types.SimpleNamespace(**info)
+
+
+class TestPaging(unittest.TestCase):
+    """Unit test for function iter_pages."""
+
+    def test_pages(self):
+        listing = Listing()
+        self.assertListEqual(list(iter_pages(listing.list, 10)), listing.items)
+        self.assertEqual(listing.calls, 3)
+
+        # exactly filled pages need an additional (empty) request
+        listing = Listing()
+        self.assertListEqual(list(iter_pages(listing.list, 5)), listing.items)
+        self.assertEqual(listing.calls, 6)
+
+    def test_unsupported(self):
+        # limit is ignored, everything is returned at once
+        listing = Listing(marker=False, limit=False)
+        self.assertListEqual(list(iter_pages(listing.list, 10)), listing.items)
+        self.assertEqual(listing.calls, 1)
+
+        # exactly page_size items, the repeated page ends the listing
+        listing = Listing(marker=False, limit=False)
+        self.assertListEqual(list(iter_pages(listing.list, 25)), listing.items)
+        self.assertEqual(listing.calls, 2)
+
+    def test_truncated(self):
+        # truncated by the server and can't be continued, independent of the page size
+        for page_size in (10, 25, 50):
+            listing = Listing(marker=False, limit=False, list_limit=10)
+            with self.assertRaises(IncompleteListing):
+                list(iter_pages(listing.list, page_size))
+
+        # truncated by the server, but continued with markers
+        listing = Listing(limit=False, list_limit=10)
+        self.assertListEqual(list(iter_pages(listing.list, 50)), listing.items)
+
+    def test_keystone_listing(self):
+        manager = Manager({'users': [{'id': 'a'}, {'id': 'b'}], 'truncated': True})
+        page = KeystoneListing(manager)(marker='x', limit=2, domain=types.SimpleNamespace(id='d'), tags=None)
+        self.assertListEqual([user.id for user in page], ['a', 'b'])
+        self.assertTrue(page.truncated)
+        self.assertListEqual(manager.urls, ['/users?domain_id=d&marker=x&limit=2'])
+
+        manager = Manager({'users': [{'id': 'a'}]})
+        self.assertFalse(KeystoneListing(manager)().truncated)
+        self.assertListEqual(manager.urls, ['/users'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from denbi.perun.endpoint import Endpoint
+from denbi.perun.plan import Grant, NetworkProvision, Planner, ProjectCreate, ProjectDelete, ProjectUpdate, \
+    QuotaUpdate, Revoke, UserCreate, UserDelete, UserUpdate
+
+
+def denbi_user(perun_id, elixir_id, enabled=True, deleted=False, email=None):
+    return {'id': 'os-' + perun_id, 'perun_id': perun_id, 'elixir_id': elixir_id, 'elixir_name': str(None),
+            'email': str(email), 'ssh_key': str(None), 'enabled': enabled, 'deleted': deleted}
+
+
+def denbi_project(perun_id, name, members, scratched=False, denbi_quotas=None):
+    return {'id': 'os-' + perun_id, 'perun_id': perun_id, 'name': name, 'description': None,
+            'enabled': not scratched, 'scratched': scratched, 'members': members, 'denbi_quotas': denbi_quotas}
+
+
+class TestPlanner(unittest.TestCase):
+    """Unit test for class Planner.
+
+    The planner does not need any Openstack setup.
+    """
+
+    def setUp(self):
+        self.planner = Planner(quota_mapping=Endpoint.DENBI_OPENSTACK_QUOTA_MAPPING,
+                               support_router=True)
+        self.user_map = {'1': denbi_user('1', 'one@elixir-europe.org'),
+                         '2': denbi_user('2', 'two@elixir-europe.org'),
+                         '3': denbi_user('3', 'three@elixir-europe.org', enabled=False, deleted=True)}
+        self.project_map = {'10': denbi_project('10', 'ten', ['1', '2']),
+                            '11': denbi_project('11', 'eleven', ['2'], denbi_quotas={'denbiCoresLimit': 4}),
+                            '12': denbi_project('12', 'twelve', [], scratched=True)}
+
+    def test_unchanged(self):
+        users = [{'perun_id': '1', 'elixir_id': 'one@elixir-europe.org', 'email': None, 'enabled': True},
+                 {'perun_id': '2', 'elixir_id': 'two@elixir-europe.org', 'email': None, 'enabled': True}]
+        projects = [{'perun_id': '10', 'name': 'ten', 'members': ['2', '1']},
+                    {'perun_id': '11', 'name': 'eleven', 'members': ['2'], 'quotas': {'denbiCoresLimit': 4}}]
+
+        plan = self.planner.plan(users, projects, self.user_map, self.project_map)
+
+        self.assertEqual(len(plan), 0, f"Expect an empty plan, but got {list(plan)}")
+
+        # unchanged quotas are compared with the quota services if wished
+        plan = self.planner.plan(users, projects, self.user_map, self.project_map, check_quotas=True)
+        self.assertListEqual(plan.quota_updates, [QuotaUpdate('11', {'denbiCoresLimit': 4}, True)])
+
+    def test_changes(self):
+        users = [{'perun_id': '1', 'elixir_id': 'one@elixir-europe.org', 'email': 'one@no-mail.nix', 'enabled': True},
+                 {'perun_id': '4', 'elixir_id': 'four@elixir-europe.org', 'email': None, 'enabled': True}]
+        projects = [{'perun_id': '10', 'name': 'ten', 'members': ['1', '4', '5']},
+                    {'perun_id': '11', 'name': 'eleven', 'members': [], 'quotas': {'denbiCoresLimit': 8,
+                                                                                   'denbiProjectObjectStorage': 1}},
+                    {'perun_id': '12', 'name': 'twelve', 'members': []},
+                    {'perun_id': '13', 'name': 'thirteen', 'members': ['1']}]
+
+        plan = self.planner.plan(users, projects, self.user_map, self.project_map)
+
+        self.assertListEqual(plan.user_creates, [UserCreate('4', 'four@elixir-europe.org', None, None, None, True)])
+        self.assertListEqual(plan.user_updates, [UserUpdate('1', 'one@elixir-europe.org', None, 'one@no-mail.nix',
+                                                            None, True)])
+        # user 3 is already deleted
+        self.assertListEqual(plan.user_deletes, [UserDelete('2')])
+        self.assertListEqual(plan.project_creates, [ProjectCreate('13', 'thirteen', None)])
+        self.assertListEqual(plan.project_updates, [ProjectUpdate('12', 'twelve', None, True)])
+        self.assertListEqual(plan.project_deletes, [])
+        # unknown user 5 is ignored
+        self.assertListEqual(plan.grants, [Grant('10', '4'), Grant('13', '1')])
+        self.assertSetEqual(plan.ignored_members, {'10'})
+        self.assertListEqual(plan.revokes, [Revoke('10', '2'), Revoke('11', '2')])
+        self.assertListEqual(plan.quota_updates, [QuotaUpdate('11', {'denbiCoresLimit': 8})])
+        self.assertListEqual(plan.network_provisions, [NetworkProvision('13', True, False)])
+        # nothing failed yet
+        self.assertTrue(plan.complete)
+        plan.incomplete.add('11')
+        self.assertFalse(plan.complete)
+
+        plan = self.planner.plan(users, [], self.user_map, self.project_map)
+        # project 12 is already scratched
+        self.assertListEqual(plan.project_deletes, [ProjectDelete('10'), ProjectDelete('11')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+import time
+import unittest
+
+from keystoneauth1 import session
+
+from denbi.perun.quotas.cache import QuotaCache
+from denbi.perun.quotas.component import NeutronQuotaComponent, NovaQuotaComponent
+from denbi.perun.quotas.manager import QuotaFactory, QuotaManager
+
+
+class QuotaSet:
+    def __init__(self, values):
+        self.values = values
+
+    def to_dict(self):
+        return {name: dict(value) if isinstance(value, dict) else value for name, value in self.values.items()}
+
+
+class NovaQuotas:
+    """Quota API of a nova like client."""
+
+    def __init__(self, quotas):
+        self.quotas = quotas
+        self.updates = []
+        self.gets = 0
+        self.details = 0
+
+    def get(self, project_id, detail=False):
+        self.gets += 1
+        if detail:
+            self.details += 1
+            return QuotaSet(self.quotas)
+        return QuotaSet(dict({name: quota['limit'] for name, quota in self.quotas.items()}, id=project_id))
+
+    def update(self, project_id, **values):
+        self.updates.append(values)
+
+
+class NovaClient:
+    def __init__(self, quotas):
+        self.quotas = NovaQuotas(quotas)
+
+
+class NeutronClient:
+    quota_path = "/quotas/%s"
+
+    def __init__(self, quotas):
+        self.quotas = quotas
+        self.updates = []
+        self.details = 0
+
+    def show_quota(self, project_id):
+        return {'quota': {name: quota['limit'] for name, quota in self.quotas.items()}}
+
+    def get(self, path):
+        self.details += 1
+        return {'quota': {name: {'limit': quota['limit'], 'used': quota['in_use'], 'reserved': 0}
+                          for name, quota in self.quotas.items()}}
+
+    def update_quota(self, project_id, body):
+        self.updates.append(body['quota'])
+
+
+def quota(limit, in_use=0):
+    return {'limit': limit, 'in_use': in_use, 'reserved': 0}
+
+
+class TestQuotaBatch(unittest.TestCase):
+    """Unit test for batched quota updates of QuotaManager."""
+
+    def setUp(self):
+        self.nova = NovaClient({'cores': quota(8, 4), 'ram': quota(1024, 512), 'instances': quota(4)})
+        self.neutron = NeutronClient({'router': quota(1), 'network': quota(1)})
+        # quota managers are usually created by the quota factory
+        self.manager = QuotaManager.__new__(QuotaManager)
+        self.manager._components = {QuotaManager.NOVA: NovaQuotaComponent(self.nova, 'p'),
+                                    QuotaManager.NEUTRON: NeutronQuotaComponent(self.neutron, 'p')}
+
+    def test_commit(self):
+        with self.manager.batch() as batch:
+            batch.stage('cores', 16)
+            batch.stage('ram', 2048)
+            batch.stage('instances', 4)  # unchanged
+            batch.stage('router', 2)
+            batch.stage('network', 2)
+            batch.stage('strange_denbi_quota', 1)  # not implemented
+
+        self.assertListEqual(self.nova.quotas.updates, [{'cores': 16, 'ram': 2048}])
+        self.assertListEqual(self.neutron.updates, [{'router': 2, 'network': 2}])
+        self.assertEqual(self.manager.get_current_quota('cores'), 16)
+        # only raised limits, so the usage is never requested
+        self.assertEqual(self.nova.quotas.details, 0)
+        self.assertEqual(self.neutron.details, 0)
+
+    def test_invalid(self):
+        batch = self.manager.batch()
+        batch.stage('cores', 16)
+        batch.stage('ram', 256)  # less than in use
+        with self.assertRaises(ValueError):
+            batch.commit()
+        self.assertListEqual(self.nova.quotas.updates, [])
+        self.assertEqual(self.manager.get_current_quota('cores'), 8)
+        self.assertEqual(self.nova.quotas.details, 1)
+
+    def test_decrease(self):
+        with self.manager.batch() as batch:
+            batch.stage('cores', 4)
+            batch.stage('ram', 512)
+            batch.stage('router', 0)
+        self.assertListEqual(self.nova.quotas.updates, [{'cores': 4, 'ram': 512}])
+        self.assertListEqual(self.neutron.updates, [{'router': 0}])
+        # the usage is requested once per component
+        self.assertEqual(self.nova.quotas.details, 1)
+        self.assertEqual(self.neutron.details, 1)
+        self.assertEqual(self.manager.get_current_in_use('ram'), 512)
+
+
+class TestQuotaCache(unittest.TestCase):
+    """Unit test for class QuotaCache."""
+
+    def test_shared(self):
+        cache = QuotaCache()
+        nova = NovaClient({'cores': quota(8)})
+        NovaQuotaComponent(nova, 'p', cache=cache).set_quota('cores', 16)
+        # quotas are requested once and written through
+        self.assertEqual(NovaQuotaComponent(nova, 'p', cache=cache).get_value('cores'), 16)
+        self.assertEqual(nova.quotas.gets, 1)
+
+        component = NovaQuotaComponent(nova, 'p', cache=cache)
+        component.flush()
+        self.assertEqual(component.get_value('cores'), 8)
+        self.assertEqual(nova.quotas.gets, 2)
+
+        # the usage is loaded on demand into the shared cache
+        self.assertEqual(component.get_in_use('cores'), 0)
+        self.assertEqual(NovaQuotaComponent(nova, 'p', cache=cache).get_in_use('cores'), 0)
+        self.assertEqual(nova.quotas.details, 1)
+
+    def test_expiry(self):
+        cache = QuotaCache(ttl=0.05, max_size=2)
+        cache.put('a', 'nova', {})
+        cache.put('b', 'nova', {})
+        cache.get('a', 'nova')
+        cache.put('c', 'nova', {})
+        # least recently used entry is evicted
+        self.assertIsNone(cache.get('b', 'nova'))
+        self.assertIsNotNone(cache.get('a', 'nova'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a', 'nova'))
+
+        cache.put('a', 'nova', {})
+        cache.put('a', 'neutron', {})
+        cache.flush('a')
+        self.assertEqual(len(cache), 0)
+
+
+class ConcurrencyProbe:
+    """Counts the calls and the maximum number of concurrent calls of a fake service."""
+
+    def __init__(self, quotas):
+        self.quotas = quotas
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self._lock:
+            self.running -= 1
+        return self.quotas
+
+
+class TestQuotaPrefetch(unittest.TestCase):
+    """Unit test for QuotaFactory.prefetch."""
+
+    def test_prefetch(self):
+        factory = QuotaFactory(session.Session(), prefetch_workers={'nova': 2, 'cinder': 1, 'neutron': 3})
+        nova = ConcurrencyProbe(QuotaSet({'id': 'p', 'cores': 8}))
+        cinder = ConcurrencyProbe(QuotaSet({'id': 'p', 'volumes': 2}))
+        neutron = ConcurrencyProbe({'quota': {'router': 1}})
+        factory._nova.quotas.get = nova
+        factory._cinder.quotas.get = cinder
+        factory._neutron.show_quota = neutron
+
+        factory.prefetch(['a', 'b', 'c', 'd', 'e', 'f'])
+        for probe, limit in ((nova, 2), (cinder, 1), (neutron, 3)):
+            self.assertEqual(probe.calls, 6)
+            self.assertLessEqual(probe.max_running, limit)
+
+        # managers use the prefetched quotas
+        manager = factory.get_manager('c')
+        self.assertEqual(manager.get_current_quota('cores'), 8)
+        self.assertEqual(manager.get_current_quota('volumes'), 2)
+        self.assertEqual(manager.get_current_quota('router'), 1)
+        self.assertEqual(nova.calls + cinder.calls + neutron.calls, 18)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from denbi.perun.records import DenbiProject, DenbiUser, intern
+
+
+class TestRecords(unittest.TestCase):
+    """Unit test for the record types DenbiUser and DenbiProject."""
+
+    def test_dict_access(self):
+        user = DenbiUser(id=intern('abc'), perun_id=intern(42), elixir_id='42@elixir-europe.org',
+                         enabled=True, deleted=False)
+        self.assertFalse(hasattr(user, '__dict__'))
+        self.assertEqual(user['perun_id'], '42')
+        self.assertIs(user['perun_id'], intern('42'))
+        self.assertEqual(user.get('email', 'unset'), 'unset')
+        self.assertNotIn('email', user)
+        user['email'] = 'None'
+        self.assertIn('email', user)
+        self.assertEqual(user, {'id': 'abc', 'perun_id': '42', 'elixir_id': '42@elixir-europe.org',
+                                'enabled': True, 'deleted': False, 'email': 'None'})
+        with self.assertRaises(KeyError):
+            user['unknown'] = 1
+        with self.assertRaises(KeyError):
+            user['ssh_key']
+
+    def test_lazy_fields(self):
+        loaded = []
+
+        def load_members(project_id):
+            loaded.append(project_id)
+            return ['1', '2']
+
+        project = DenbiProject(load_members, lambda project_id: {'cores': 8}, id='p', perun_id='9')
+        self.assertNotIn('members', project)
+        self.assertIsNone(project.get('members'))
+        self.assertListEqual(loaded, [])
+
+        self.assertListEqual(project['members'], ['1', '2'])
+        self.assertListEqual(project['members'], ['1', '2'])
+        self.assertListEqual(loaded, ['p'])
+        self.assertEqual(project['quotas']['cores'], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
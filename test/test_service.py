@@ -0,0 +1,97 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tarfile
+import tempfile
+import unittest
+
+from unittest import mock
+
+from denbi.perun.plan import Plan
+
+# the service is configured by the environment on import
+_directory = tempfile.mkdtemp()
+os.environ.setdefault('PKA_BASE_DIR', _directory)
+os.environ.setdefault('PKA_LOG_DIR', _directory)
+from denbi.scripts import perun_propagation_service as service  # noqa: E402
+
+
+class FakeEndpoint:
+    """Endpoint whose imports fail or are (in)complete as told."""
+
+    def __init__(self):
+        self.imports = 0
+        self.result = 'complete'
+
+    def import_data(self, users, groups):
+        self.imports += 1
+        if self.result == 'fail':
+            raise Exception("import failed")
+        plan = Plan()
+        if self.result == 'incomplete':
+            plan.incomplete.add('10')
+        return plan
+
+
+class TestLastImport(unittest.TestCase):
+    """Unit test for skipping unchanged uploads in the propagation service."""
+
+    def setUp(self):
+        self.resources = os.path.join(os.path.dirname(__file__), 'resources', 'scim')
+        self.directory = tempfile.mkdtemp()
+        self.endpoint = FakeEndpoint()
+        patcher = mock.patch.object(service, 'get_endpoint', return_value=self.endpoint)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_tarball(self, name, users):
+        path = os.path.join(self.directory, name)
+        with tarfile.open(path, 'w:gz') as tar:
+            tar.add(os.path.join(self.resources, users), arcname='./users.scim')
+            tar.add(os.path.join(self.resources, 'groups.scim'), arcname='./groups.scim')
+        return path
+
+    def process(self, path, result='complete'):
+        self.endpoint.result = result
+        return service.process_tarball(path, base_dir=self.directory)
+
+    def test_skip_unchanged(self):
+        first = self.create_tarball('first.tar.gz', 'users.scim')
+        self.assertIsNotNone(self.process(first))
+        self.assertIsNone(self.process(first))
+        self.assertEqual(self.endpoint.imports, 1)
+
+        # incomplete imports are not remembered
+        second = self.create_tarball('second.tar.gz', 'users_2nd.scim')
+        self.process(second, 'incomplete')
+        self.process(second, 'incomplete')
+        self.assertEqual(self.endpoint.imports, 3)
+
+    def test_failed_import(self):
+        first = self.create_tarball('first.tar.gz', 'users.scim')
+        second = self.create_tarball('second.tar.gz', 'users_2nd.scim')
+        self.process(first)
+        with self.assertRaises(Exception):
+            self.process(second, 'fail')
+        # keystone may contain parts of the second upload now, so the first one is not skipped
+        self.assertIsNotNone(self.process(first))
+        self.assertEqual(self.endpoint.imports, 3)
+
+        # an incomplete import invalidates the last import as well
+        self.process(second, 'incomplete')
+        self.assertIsNotNone(self.process(first))
+        self.assertEqual(self.endpoint.imports, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from denbi.perun.quotas.component import NovaQuotaComponent
+from denbi.perun.quotas.snapshot import SnapshotProgress, export_snapshot
+from test.test_quotas import NovaClient, quota
+
+
+class Component:
+    def __init__(self, quotas):
+        self.quotas = quotas
+
+    def snapshot(self):
+        if self.quotas is None:
+            raise Exception("service unavailable")
+        return self.quotas
+
+
+class Factory:
+    """Quota factory returning a fixed quota per service, failing for the given projects."""
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.requested = []
+
+    def get_component(self, service, project_id, cache=True):
+        self.requested.append((service, project_id))
+        if project_id in self.failing and service == 'neutron':
+            return Component(None)
+        return Component({f"{service}_quota": {'limit': 10, 'in_use': 2, 'reserved': 1}})
+
+
+def projects(*ids):
+    return [{'id': project_id, 'perun_id': f"perun_{project_id}", 'name': f"project {project_id}"}
+            for project_id in ids]
+
+
+class TestQuotaSnapshot(unittest.TestCase):
+    """Unit test for the quota snapshot export."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.progress_file = os.path.join(self.tmp.name, 'progress')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_jsonl(self):
+        output = io.StringIO()
+        self.assertEqual(export_snapshot(Factory(), projects('a', 'b'), output), (2, 0))
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertIn({'project_id': 'a', 'perun_id': 'perun_a', 'project_name': 'project a', 'service': 'cinder',
+                       'quota': 'cinder_quota', 'limit': 10, 'in_use': 2, 'reserved': 1}, rows)
+
+    def test_csv(self):
+        output = io.StringIO()
+        export_snapshot(Factory(), projects('a'), output, output_format='csv')
+        rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+        self.assertListEqual([row['quota'] for row in rows], ['nova_quota', 'cinder_quota', 'neutron_quota'])
+        self.assertEqual(rows[0]['in_use'], '2')
+
+        with self.assertRaises(ValueError):
+            export_snapshot(Factory(), projects('a'), output, output_format='xml')
+
+    def test_resume(self):
+        output = io.StringIO()
+        with SnapshotProgress(self.progress_file) as progress:
+            # quotas of b can't be read, b is not written and retried later
+            self.assertEqual(export_snapshot(Factory(failing=('b',)), projects('a', 'b'), output, progress=progress),
+                             (1, 1))
+        self.assertEqual(len(output.getvalue().splitlines()), 3)
+
+        factory = Factory()
+        with SnapshotProgress(self.progress_file) as progress:
+            self.assertEqual(export_snapshot(factory, projects('a', 'b', 'c'), output, progress=progress), (2, 0))
+        self.assertNotIn(('nova', 'a'), factory.requested)
+        exported = {json.loads(line)['project_id'] for line in output.getvalue().splitlines()}
+        self.assertSetEqual(exported, {'a', 'b', 'c'})
+        self.assertEqual(len(output.getvalue().splitlines()), 9)
+        with SnapshotProgress(self.progress_file) as progress:
+            self.assertEqual(len(progress), 3)
+
+    def test_component(self):
+        nova = NovaClient({'cores': quota(8, 4)})
+        component = NovaQuotaComponent(nova, 'p')
+        self.assertDictEqual(component.snapshot(), {'cores': quota(8, 4)})
+        # limits and usage are read with a single request
+        self.assertEqual(nova.quotas.gets, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
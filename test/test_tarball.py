@@ -0,0 +1,60 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tarfile
+import tempfile
+import unittest
+
+from denbi.perun.endpoint import import_json, iter_json
+from denbi.perun.tarball import PerunTarball
+
+
+class TestPerunTarball(unittest.TestCase):
+    """Unit test for class PerunTarball.
+
+    Reading a tarball does not need any Openstack setup.
+    """
+
+    def setUp(self):
+        self.resources = os.path.join(os.path.dirname(__file__), 'resources', 'scim')
+        self.directory = tempfile.mkdtemp()
+
+    def create_tarball(self, name, members):
+        path = os.path.join(self.directory, name)
+        with tarfile.open(path, 'w:gz') as tar:
+            for member in members:
+                tar.add(os.path.join(self.resources, member), arcname='./' + member)
+        return path
+
+    def test_read(self):
+        path = self.create_tarball('perun.tar.gz', ['groups.scim', 'users_2nd.scim', 'users.scim'])
+        with PerunTarball(path) as tarball:
+            self.assertListEqual(list(iter_json(tarball.open('users.scim'))),
+                                 import_json(os.path.join(self.resources, 'users.scim')))
+            self.assertListEqual(list(iter_json(tarball.open('groups.scim'))),
+                                 import_json(os.path.join(self.resources, 'groups.scim')))
+            digest = tarball.digest()
+
+        # the digest only depends on the content of users.scim and groups.scim
+        path = self.create_tarball('other.tar.gz', ['users.scim', 'groups.scim'])
+        with PerunTarball(path) as tarball:
+            self.assertEqual(tarball.digest(), digest)
+
+    def test_missing_member(self):
+        path = self.create_tarball('perun.tar.gz', ['users.scim'])
+        with self.assertRaises(ValueError):
+            PerunTarball(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
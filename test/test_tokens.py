@@ -0,0 +1,72 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+import os
+import stat
+import tempfile
+import unittest
+
+from keystoneauth1 import access
+from keystoneauth1.identity import v3
+
+from denbi.perun.tokens import TokenCache
+
+
+def password_auth(password='secret'):
+    return v3.Password(auth_url='https://keystone.example.org/v3', username='admin', password=password,
+                       project_name='admin', user_domain_name='Default', project_domain_name='Default')
+
+
+def token(valid_for):
+    expires = (datetime.datetime.utcnow() + valid_for).strftime('%Y-%m-%dT%H:%M:%S.000000Z')
+    body = {'token': {'expires_at': expires, 'methods': ['password'], 'catalog': [],
+                      'user': {'id': 'u', 'name': 'admin', 'domain': {'id': 'default', 'name': 'Default'}},
+                      'project': {'id': 'p', 'name': 'admin', 'domain': {'id': 'default', 'name': 'Default'}}}}
+    return access.create(body=body, auth_token='token')
+
+
+class TestTokenCache(unittest.TestCase):
+    """Unit test for class TokenCache.
+
+    The token cache does not need any Openstack setup, tokens are created locally.
+    """
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'tokens.json')
+        self.cache = TokenCache(self.path, min_validity=300)
+
+    def test_reuse(self):
+        auth = password_auth()
+        auth.auth_ref = token(datetime.timedelta(hours=1))
+        self.cache.store(auth)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+        auth = password_auth()
+        self.assertTrue(self.cache.load(auth))
+        self.assertEqual(auth.auth_ref.auth_token, 'token')
+
+        # different credentials do not share tokens
+        self.assertFalse(self.cache.load(password_auth(password='other')))
+
+    def test_expiring(self):
+        auth = password_auth()
+        auth.auth_ref = token(datetime.timedelta(minutes=1))
+        self.cache.store(auth)
+
+        auth = password_auth()
+        self.assertFalse(self.cache.load(auth))
+        self.assertIsNone(auth.auth_ref)
+
+
+if __name__ == '__main__':
+    unittest.main()